@@ -1,9 +1,14 @@
 import streamlit as st
 
+from src import startup
+
 st.set_page_config(
     page_title="Home",
     page_icon="🏠",
 )
+# Import the heavy libraries and load the model and dataset in the background while this page is read,
+# so the other pages open without paying for them. Only the standard library is imported here
+startup.start_warmup()
 st.sidebar.success("Select a demo above.")
 # Project introduction page of our house prediction project web app
 
@@ -1,156 +1,195 @@
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-import matplotlib.pyplot as plt
+import plotly.graph_objects as go
+
+from src import aggregates, artifacts, downsample, metrics, startup, storage
 
 st.set_page_config(
     page_title="Visualization",
     page_icon="📊",
 )
 st.sidebar.header("Data Visualization")
-
-def main():
-    st.title('📊 Visualization')
-    st.subheader('Welcome to the Visualization Page!', divider='rainbow')
-
-    st.header('Data Exploration 📊')
-    st.write('''In this section, we will explore the dataset to understand the distribution of the features and identify patterns in the data.''')
-    
-    def load_data(file_path):
-        try:
-            data = pd.read_csv(file_path)
-            return data
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
-            return None
-
-    # Load data (replace 'your_file.csv' with your actual file path)
-    file_path = 'notebooks/data/kc_house_data.csv'
+# A session may open this page directly, without visiting Home first
+startup.start_warmup()
+metrics.start_exporters()
+
+def load_data(file_path):
+    try:
+        # Cached per server process; the page only mutates copies of it
+        data = artifacts.load_artifact(file_path, storage.read_dataset)
+        return data
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+def cached_figure(file_path, name, build, *options):
+    # Figures are built once per version of the dataset and set of options, then shared by every session
+    def timed_build():
+        with metrics.timed(f'figure/{name}'):
+            return build()
+    return artifacts.memoize(file_path, (name,) + options, timed_build)
+
+def show_raw_data(file_path, summary):
+    st.header('Raw Data 🗂️')
     df = load_data(file_path)
-    df_display = df.copy()
+    # Only the current page of rows is converted and sent to the browser
+    page_size = st.selectbox('Rows per page', [25, 100, 500], index=1)
+    pages = -(-len(df) // page_size)
+    page = st.number_input(f'Page (1-{pages})', min_value=1, max_value=pages, value=1)
+    df_display = df.iloc[(page - 1) * page_size:page * page_size].copy()
     df_display['date'] = pd.to_datetime(df_display['date'])
     st.dataframe(df_display)
-    st.divider()
+    st.caption(f'Rows {(page - 1) * page_size + 1}-{(page - 1) * page_size + len(df_display)} of {len(df)}')
 
+def show_data_summary(file_path, summary):
     # Display the summary of the data
     st.header('Data Summary 📈')
-    st.write(df.describe())
-    st.divider()
+    st.write(artifacts.memoize(file_path, ('describe',), lambda: aggregates.describe(summary)))
 
+def show_price_distribution(file_path, summary):
     # Display the price distribution
     st.header('Price Distribution 📊')
-    fig = px.histogram(df, x='price', title='Price Distribution')
-    st.plotly_chart(fig)
+    def build():
+        fig = px.histogram(aggregates.value_counts(summary, 'price'), x='price', y='count', histfunc='sum', title='Price Distribution')
+        fig.update_yaxes(title='count')
+        return fig
+    st.plotly_chart(cached_figure(file_path, 'price_distribution', build))
     st.write('Conclusions: The price distribution is right-skewed, which means that most of the houses have a lower price.')
-    st.divider()
 
+def show_map(file_path, summary):
     # Map of houses based on location
     st.header('Map of Houses 🗺️')
-    st.write('The map below shows the location of the houses in the dataset.')
-    fig = px.scatter_mapbox(df, lat='lat', lon='long', color='price', size='price', hover_name='price', zoom=9, title='Map of King County Houses')
-    fig.update_layout(mapbox_style='open-street-map', autosize=False, width=800, height=700)
-    st.plotly_chart(fig)
-    st.write('Conclusions: The houses are located in the King County area of Washington. The price of the houses is represented by the color and size of the markers.')
-    st.divider()
-
+    st.write('The map below shows the location of the houses in the dataset, grouped into hexagonal areas.')
+    # Houses are binned on the server so the payload stays bounded however many sales there are
+    map_detail = st.slider('Map detail', min_value=8, max_value=13, value=10, help='Higher values show smaller areas')
+    def build():
+        cells = downsample.hex_bin(load_data(file_path), downsample.hex_size_for_zoom(map_detail))
+        fig = px.scatter_mapbox(cells, lat='lat', lon='long', color='price', size='count', hover_data={'count': True, 'price': ':,.0f'},
+                                zoom=9, title='Map of King County Houses', labels={'price': 'Mean Price', 'count': 'Houses'})
+        fig.update_layout(mapbox_style='open-street-map', autosize=False, width=800, height=700)
+        return fig
+    st.plotly_chart(cached_figure(file_path, 'map_of_king_county_houses', build, map_detail))
+    st.write('Conclusions: The houses are located in the King County area of Washington. The mean price of the houses in each area is represented by the color of the markers, and the number of houses by their size.')
+
+def show_price_vs_sqft_living(file_path, summary):
     # Display scatter plot of price vs sqft_living
     st.header('Price vs Sqft Living Scatter Plot 📈')
-    fig = px.scatter(df, x='sqft_living', y='price', title='Price vs Sqft Living Scatter Plot', color='price', labels={'sqft_living': 'Sqft Living', 'price': 'Price'})
+    scatter_mode = st.radio('Show', ['Density', 'Sample'], horizontal=True,
+                            help='Density counts houses on a grid; Sample plots a stratified sample of individual houses')
+    if scatter_mode == 'Density':
+        scatter_resolution = st.slider('Grid resolution', min_value=20, max_value=200, value=80, step=10)
+        def build():
+            counts, x_centres, y_centres = downsample.density_bins(load_data(file_path), 'sqft_living', 'price', bins=scatter_resolution)
+            # The grid is drawn as computed; a histogram trace would re-bin the centres on plotly's own edges
+            fig = go.Figure(go.Heatmap(z=counts, x=x_centres, y=y_centres, colorbar={'title': 'Houses'},
+                                       hovertemplate='Sqft Living: %{x:,.0f}<br>Price: %{y:,.0f}<br>Houses: %{z}<extra></extra>'))
+            fig.update_layout(title='Price vs Sqft Living Density Plot', xaxis_title='Sqft Living', yaxis_title='Price')
+            return fig
+        fig = cached_figure(file_path, 'price_vs_sqft_living_density_plot', build, scatter_resolution)
+    else:
+        sample_size = st.slider('Sample size', min_value=1000, max_value=20000, value=5000, step=1000)
+        def build():
+            sample = downsample.stratified_sample(load_data(file_path)[['sqft_living', 'price']], 'sqft_living', n=sample_size)
+            return px.scatter(sample, x='sqft_living', y='price', title='Price vs Sqft Living Scatter Plot', color='price', labels={'sqft_living': 'Sqft Living', 'price': 'Price'})
+        fig = cached_figure(file_path, 'price_vs_sqft_living_scatter_plot', build, sample_size)
     st.plotly_chart(fig)
     st.write('Conclusions: The price of the house increases with the increase in the square feet of living area.')
-    st.divider()
 
-    # Display number of floors count plot
-    st.header('Number of Floors Count Plot 📊')
-    floor_counts = df['floors'].value_counts().reset_index()
-    floor_counts.columns = ['floors', 'count']
-    fig = px.bar(floor_counts, x='floors', y='count', title='Number of Floors Count Plot', labels={'floors': 'Floors', 'count': 'Count'}, color='floors')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses have 1 floor.')
-    st.divider()
-
-    # Display number of bedrooms count plot
-    st.header('Number of Bedrooms Count Plot 📊')
-    bedroom_counts = df['bedrooms'].value_counts().reset_index()
-    bedroom_counts.columns = ['bedrooms', 'count']
-    fig = px.bar(bedroom_counts, x='bedrooms', y='count', title='Number of Bedrooms Count Plot', labels={'bedrooms': 'Bedrooms', 'count': 'Count'}, color='bedrooms')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses have 3 bedrooms.')
-    st.divider()
-
-    # Display grade count plot
-    st.header('Grade Count Plot 📊')
-    grade_counts = df['grade'].value_counts().reset_index()
-    grade_counts.columns = ['grade', 'count']
-    fig = px.bar(grade_counts, x='grade', y='count', title='Grade Count Plot', labels={'grade': 'Grade', 'count': 'Count'}, color='grade')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses have a grade of 7, which is average.')
-    st.divider()
-
-    # Display condition count plot
-    st.header('Condition Count Plot 📊')
-    condition_counts = df['condition'].value_counts().reset_index()
-    condition_counts.columns = ['condition', 'count']
-    fig = px.bar(condition_counts, x='condition', y='count', title='Condition Count Plot', labels={'condition': 'Condition', 'count': 'Count'}, color='condition')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses have a condition of 3, which is average.')
-    st.divider()
-
-    # Display waterfront count plot
-    st.header('Waterfront Count Plot 📊')
-    waterfront_counts = df['waterfront'].value_counts().reset_index()
-    waterfront_counts.columns = ['waterfront', 'count']
-    fig = px.bar(waterfront_counts, x='waterfront', y='count', title='Waterfront Count Plot', labels={'waterfront': 'Waterfront', 'count': 'Count'}, color='waterfront')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses do not have a waterfront view.')
-    st.divider()
-
-    # Display view count plot
-    st.header('View Count Plot 📊')
-    view_counts = df['view'].value_counts().reset_index()
-    view_counts.columns = ['view', 'count']
-    fig = px.bar(view_counts, x='view', y='count', title='View Count Plot', labels={'view': 'View', 'count': 'Count'}, color='view')
-    st.plotly_chart(fig)
-    st.write('Conclusions: Most of the houses have a view of 0, which is average.')
-    st.divider()
+def show_count_plot(file_path, summary, column, label, conclusion):
+    # Display the count plot of one column
+    st.header(f'{label} Count Plot 📊')
+    def build():
+        counts = aggregates.value_counts(summary, column)
+        return px.bar(counts, x=column, y='count', title=f'{label} Count Plot', labels={column: label.replace('Number of ', ''), 'count': 'Count'}, color=column)
+    st.plotly_chart(cached_figure(file_path, f"{label.lower().replace(' ', '_')}_count_plot", build))
+    st.write(f'Conclusions: {conclusion}')
 
+def show_year_built_vs_price(file_path, summary):
     # Display year built vs price line plot
     st.header('Year Built vs Price Line Plot 📈')
-    year_price = df.groupby('yr_built')['price'].mean().reset_index()
-    fig = px.line(year_price, x='yr_built', y='price', title='Year Built vs Price Line Plot', labels={'yr_built': 'Year Built', 'price': 'Price'})
-    st.plotly_chart(fig)
+    def build():
+        year_price = aggregates.mean_price_by(summary, 'yr_built')
+        return px.line(year_price, x='yr_built', y='price', title='Year Built vs Price Line Plot', labels={'yr_built': 'Year Built', 'price': 'Price'})
+    st.plotly_chart(cached_figure(file_path, 'year_built_vs_price_line_plot', build))
     st.write('''Conclusions: The price of the houses increases with the year built. Newer houses tend to have a higher price. 
              Price of the houses decreases during the 2008 recession and 1940 due to the World War II.''')
-    st.divider()
 
+def show_year_renovated_vs_price(file_path, summary):
     # Display year renovated vs price line plot from 1934 to 2015
     st.header('Year Renovated vs Price Line Plot 📈')
-    year_price = df.groupby('yr_renovated')['price'].mean().reset_index()
-    year_price = year_price[year_price['yr_renovated'] != 0]
-    year_price = year_price[(year_price['yr_renovated'] >= 1934) & (year_price['yr_renovated'] <= 2015)]
-    fig = px.line(year_price, x='yr_renovated', y='price', title='Year Renovated vs Price Line Plot', labels={'yr_renovated': 'Year Renovated', 'price': 'Price'})
-    st.plotly_chart(fig)
+    def build():
+        year_price = aggregates.mean_price_by(summary, 'yr_renovated')
+        year_price = year_price[year_price['yr_renovated'] != 0]
+        year_price = year_price[(year_price['yr_renovated'] >= 1934) & (year_price['yr_renovated'] <= 2015)]
+        return px.line(year_price, x='yr_renovated', y='price', title='Year Renovated vs Price Line Plot', labels={'yr_renovated': 'Year Renovated', 'price': 'Price'})
+    st.plotly_chart(cached_figure(file_path, 'year_renovated_vs_price_line_plot', build))
     st.write('Conclusions: The price of the houses increases with the year renovated.')
-    st.divider()
 
+def show_date_vs_price(file_path, summary):
     # Display date vs price line plot
     st.header('Date vs Price Line Plot 📈')
-    date_price = df_display.groupby('date')['price'].mean().reset_index()
-    fig = px.line(date_price, x='date', y='price', title='Date vs Price Line Plot', labels={'date': 'Date', 'price': 'Price'})
-    st.plotly_chart(fig)
+    def build():
+        date_price = aggregates.mean_price_by(summary, 'date')
+        date_price['date'] = pd.to_datetime(date_price['date'])
+        return px.line(date_price, x='date', y='price', title='Date vs Price Line Plot', labels={'date': 'Date', 'price': 'Price'})
+    st.plotly_chart(cached_figure(file_path, 'date_vs_price_line_plot', build))
     st.write('Conclusions: The price of the houses increases with time.')
-    st.divider()
 
+def show_month_vs_price(file_path, summary):
     # Display month vs price line plot from January to December
     st.header('Month vs Price Line Plot 📈')
-    df_display['month'] = df_display['date'].dt.month
-    month_df = {'month': ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'],
-                'price': df_display.groupby('month')['price'].mean().values}
-    month_df = pd.DataFrame(month_df)
-    fig = px.line(month_df, x='month', y='price', title='Month vs Price Line Plot', labels={'month': 'Month', 'price': 'Price'})
-    st.plotly_chart(fig)
+    def build():
+        month_df = {'month': ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'],
+                    'price': aggregates.mean_price_by(summary, 'month')['price'].values}
+        month_df = pd.DataFrame(month_df)
+        return px.line(month_df, x='month', y='price', title='Month vs Price Line Plot', labels={'month': 'Month', 'price': 'Price'})
+    st.plotly_chart(cached_figure(file_path, 'month_vs_price_line_plot', build))
     st.write('Conclusions: The price of the houses is highest in May and June.')
+
+def count_section(column, label, conclusion):
+    return lambda file_path, summary: show_count_plot(file_path, summary, column, label, conclusion)
+
+# Sections of the page in display order. Only the selected ones load data and build figures
+SECTIONS = {
+    'Raw Data': show_raw_data,
+    'Data Summary': show_data_summary,
+    'Price Distribution': show_price_distribution,
+    'Map of Houses': show_map,
+    'Price vs Sqft Living': show_price_vs_sqft_living,
+    'Number of Floors': count_section('floors', 'Number of Floors', 'Most of the houses have 1 floor.'),
+    'Number of Bedrooms': count_section('bedrooms', 'Number of Bedrooms', 'Most of the houses have 3 bedrooms.'),
+    'Grade': count_section('grade', 'Grade', 'Most of the houses have a grade of 7, which is average.'),
+    'Condition': count_section('condition', 'Condition', 'Most of the houses have a condition of 3, which is average.'),
+    'Waterfront': count_section('waterfront', 'Waterfront', 'Most of the houses do not have a waterfront view.'),
+    'View': count_section('view', 'View', 'Most of the houses have a view of 0, which is average.'),
+    'Year Built vs Price': show_year_built_vs_price,
+    'Year Renovated vs Price': show_year_renovated_vs_price,
+    'Date vs Price': show_date_vs_price,
+    'Month vs Price': show_month_vs_price,
+}
+
+def main():
+    st.title('📊 Visualization')
+    st.subheader('Welcome to the Visualization Page!', divider='rainbow')
+
+    st.header('Data Exploration 📊')
+    st.write('''In this section, we will explore the dataset to understand the distribution of the features and identify patterns in the data.''')
+
+    file_path = artifacts.RAW_DATA_PATH
+    try:
+        # Summaries are computed once per version of the CSV and persisted next to it
+        summary = artifacts.load_artifact(file_path, aggregates.load_summary)
+    except Exception as e:
+        st.error(f"Error loading data summary: {e}")
+        return
+
+    selected = st.multiselect('Choose the charts to show', list(SECTIONS), default=['Price Distribution'])
     st.divider()
+    for name, show in SECTIONS.items():
+        if name in selected:
+            show(file_path, summary)
+            st.divider()
 
     # Conclusions
     st.header('Conclusions 📝')
@@ -173,5 +212,6 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    with metrics.timed('page/visualization'):
+        main()
     
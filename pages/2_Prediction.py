@@ -1,20 +1,29 @@
+import os
+
 import streamlit as st
-import joblib
 import pandas as pd
 import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
 
-# import mysql.connector
-# from mysql.connector import Error
+from src import artifacts, comps, drift, explain, metrics, registry, sensitivity, startup
+from src.features import house_age as compute_house_age
+from src.predict import FEATURE_COLUMNS, predict_frame
+from src.prediction_cache import explanation_cache, prediction_cache
+from src.prediction_log import get_logger
 
 st.set_page_config(
     page_title="Prediction",
     page_icon="🔮",
 )
 st.sidebar.header("🔮Price Prediction")
+# A session may open this page directly, without visiting Home first
+startup.start_warmup()
+metrics.start_exporters()
 
 def load_model(file_path):
     try:
-        model = joblib.load(file_path)
+        model = artifacts.load_model(file_path)
         return model
     except Exception as e:
         st.error(f"Error loading model: {e}")
@@ -22,7 +31,7 @@ def load_model(file_path):
     
 def load_scaler(file_path):
     try:
-        scaler = joblib.load(file_path)
+        scaler = artifacts.load_scaler(file_path)
         return scaler
     except Exception as e:
         st.error(f"Error loading scaler: {e}")
@@ -30,95 +39,104 @@ def load_scaler(file_path):
 
 def load_processed_data(file_path):
     try:
-        data = pd.read_csv(file_path)
+        data = artifacts.load_processed_data(file_path)
         return data
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
     
-# Load model, scaler, and processed data
-model = load_model('artifacts/xgb_model.pkl')
-scaler = load_scaler('artifacts/scaler.pkl')
-data = load_processed_data('notebooks/data/processed_data.csv')
-
-def predict_price(model, scaler, data, input_data):
+# Load model and scaler (cached per server process, reloaded only when the files change).
+# The processed data is not needed for prediction, so it is no longer loaded here.
+# The active model is chosen by name in the model registry (artifacts/xgb_model.pkl if none is registered)
+try:
+    model_path, scaler_path = registry.active_paths()
+except Exception as e:
+    st.error(f"Error selecting the active model: {e}")
+    model_path, scaler_path = artifacts.MODEL_PATH, artifacts.SCALER_PATH
+model = load_model(model_path)
+scaler = load_scaler(scaler_path)
+
+def predict_price(model, scaler, input_data):
     try:
-        # Scale the input data
-        input_data_scaled = scaler.transform(input_data)
-        # Predict the price
-        predicted_price = model.predict(input_data_scaled)
+        # Repeated inputs are answered from the shared prediction cache; only new ones are scaled and predicted
+        rows = input_data[FEATURE_COLUMNS].values.tolist()
+        predicted_price = prediction_cache.predict(
+            rows, lambda missing: predict_frame(model, scaler, pd.DataFrame(missing, columns=FEATURE_COLUMNS)))
         return predicted_price
     except Exception as e:
         st.error(f"Error predicting price: {e}")
         return None
 
-# ============================================================================================================================= #
-
-# Function to create a connection to the database
-
-# def create_connection():
-#     try:
-#         connection = mysql.connector.connect(
-#             host='your_host',
-#             port='your_port',
-#             user='your_root',
-#             password='your_password',  # Replace with your MySQL root password
-#             database='your_database'
-#         )
-#         if connection.is_connected():
-#             st.success("Successfully connected to the database")
-#         return connection
-#     except Error as e:
-#         st.write(f"Error: '{e}'")
-#         return None
-    
-# Create house_price_prediction table in the database
-
-# def create_table(connection):
-#     try:
-#         cursor = connection.cursor()
-#         cursor.execute('''
-#             CREATE TABLE IF NOT EXISTS house_price_prediction (
-#                 id INT AUTO_INCREMENT PRIMARY KEY,
-#                 bedrooms INT,
-#                 bathrooms FLOAT,
-#                 sqft_living INT,
-#                 sqft_lot INT,
-#                 floors FLOAT,
-#                 waterfront INT,
-#                 view INT,
-#                 `condition` INT,
-#                 grade INT,
-#                 sqft_above INT,
-#                 sqft_basement INT,
-#                 yr_built INT,
-#                 yr_renovated INT,
-#                 lat FLOAT,
-#                 `long` FLOAT,
-#                 sqft_living15 INT,
-#                 sqft_lot15 INT,
-#                 year INT,
-#                 month INT,
-#                 house_age INT,
-#                 predicted_price FLOAT
-#             )
-#         ''')
-#     except Error as e:
-#         st.write(f"Error: '{e}'")
-
-# Function to insert input data into the database
-
-# def insert_data(connection, bedrooms, bathrooms, sqft_living, sqft_lot, floors, waterfront, view, condition, grade, sqft_above, 
-#                 sqft_basement, yr_built, yr_renovated, lat, long, sqft_living15, sqft_lot15, year, month, house_age, predicted_price):
-#     try:
-#         cursor = connection.cursor()
-#         predict_price = np.round(predicted_price[0], 2)
-#         cursor.execute(f"INSERT INTO house_price_prediction (bedrooms, bathrooms, sqft_living, sqft_lot, floors, waterfront, view, `condition`, grade, sqft_above, sqft_basement, yr_built, yr_renovated, lat, `long`, sqft_living15, sqft_lot15, year, month, house_age, predicted_price) VALUES ({bedrooms}, {bathrooms}, {sqft_living}, {sqft_lot}, {floors}, {waterfront}, {view}, {condition}, {grade}, {sqft_above}, {sqft_basement}, {yr_built}, {yr_renovated}, {lat}, {long}, {sqft_living15}, {sqft_lot15}, {year}, {month}, {house_age}, {predict_price})")
-#         connection.commit()
-#     except Error as e:
-#         st.write(f"Error: '{e}'")
-
-# ==============================================================================================================================#
+def check_drift(input_data, predicted_price):
+    try:
+        # Returns the features of this house that are outside the range seen in training
+        return drift.get_monitor().observe(input_data[FEATURE_COLUMNS].values, predicted_price)[0]
+    except Exception as e:
+        st.error(f"Error checking input drift: {e}")
+        return []
+
+def explain_price(model, scaler, input_data):
+    # Contributions come from the tree paths of an XGBoost booster; other registered models are not explained
+    if not hasattr(model, 'get_booster'):
+        return None
+    try:
+        # Contributions are cached next to the predictions, keyed on the same feature row
+        rows = input_data[FEATURE_COLUMNS].values.tolist()
+        contributions = explanation_cache.predict(
+            rows, lambda missing: explain.explain_rows(model, scaler, pd.DataFrame(missing, columns=FEATURE_COLUMNS)))
+        return contributions[0]
+    except Exception as e:
+        st.error(f"Error explaining price: {e}")
+        return None
+
+def plot_explanation(contributions):
+    # Waterfall from the model's average prediction through the largest feature contributions to the predicted price
+    steps = explain.waterfall_steps(contributions)
+    fig = go.Figure(go.Waterfall(
+        orientation='h',
+        measure=['absolute'] + ['relative'] * len(steps) + ['total'],
+        y=['Average price'] + [name for name, _ in steps] + ['Predicted price'],
+        x=[contributions[-1]] + [value for _, value in steps] + [0],
+    ))
+    fig.update_layout(title='Contribution of each feature to the price', yaxis={'autorange': 'reversed'}, showlegend=False)
+    return fig
+
+def sensitivity_sweep(model, scaler, input_data, features, points):
+    try:
+        # Every variation of the chosen features is scaled and predicted in a single batch
+        values = {feature: sensitivity.sweep_values(feature, points) for feature in features}
+        return sensitivity.sweep(model, scaler, input_data, values)
+    except Exception as e:
+        st.error(f"Error running sensitivity sweep: {e}")
+        return None
+
+def plot_sensitivity(result, features):
+    if len(features) == 1:
+        fig = px.line(result, x=features[0], y='predicted_price', markers=True,
+                      title=f'Predicted price as {features[0]} changes')
+    else:
+        prices = result.pivot(index=features[1], columns=features[0], values='predicted_price')
+        fig = px.imshow(prices, origin='lower', aspect='auto', color_continuous_scale='Viridis',
+                        labels={'color': 'predicted_price'},
+                        title=f'Predicted price as {features[0]} and {features[1]} change')
+    return fig
+
+def find_comps(input_data, k=5):
+    try:
+        index = comps.load_index()
+        return index.query(input_data, k)
+    except Exception as e:
+        st.error(f"Error finding comparable sales: {e}")
+        return None
+
+# Function to save the input and prediction in the database
+
+def log_prediction(input_data, predicted_price):
+    try:
+        # Queued and written in batches by a background thread, so the page never waits on the database
+        get_logger().log(input_data, predicted_price)
+    except Exception as e:
+        st.error(f"Error saving prediction: {e}")
 
 def main():
     st.title('🔮 Price Prediction')
@@ -201,6 +219,17 @@ def main():
     long = st.number_input('Longitude', min_value=-122.518, max_value=-121.315, value=-122.257)
     st.divider()
 
+    # Comparable past sales near the entered location, also used to suggest the neighbourhood areas below
+    comparable_sales = find_comps({'lat': lat, 'long': long, 'sqft_living': sqft_living, 'grade': grade,
+                                   'bedrooms': bedrooms, 'bathrooms': bathrooms})
+    if comparable_sales is not None:
+        with st.expander('🏘️ Comparable sales near this location'):
+            st.dataframe(comparable_sales, hide_index=True)
+        neighbourhood = comps.suggest_neighbourhood(comparable_sales)
+        st.markdown(f"*Comparable sales suggest about {neighbourhood['sqft_living15']} sqft living and "
+                    f"{neighbourhood['sqft_lot15']} sqft lot for the nearest 15 neighbors.*")
+    st.divider()
+
     st.write('Enter the living space area (in square feet) of the nearest 15 neighbors.')
     sqft_living_15 = st.number_input('Sqft Living of Nearest 15 Neighbors', min_value=390, max_value=6210, value=1820)
     st.divider()
@@ -218,7 +247,7 @@ def main():
     st.divider()
 
     st.write('Age of the house when sold')
-    age = yr_sold - yr_built
+    age = compute_house_age(yr_sold, yr_built)
     st.write(f'The age of the house when sold is {age} years. Enter it below.')
     house_age = st.number_input('House Age', min_value=0, max_value=115, value=age)
 
@@ -247,32 +276,58 @@ def main():
     }
 
     # Convert the input data to a into a DataFrame
-    input_df = pd.DataFrame([input_data])
+    with metrics.timed('build_input_dataframe'):
+        input_df = pd.DataFrame([input_data])
 
     # Predict the price
     if st.button('Predict Price'):
-        predicted_price = predict_price(model, scaler, data, input_df)
+        predicted_price = predict_price(model, scaler, input_df)
         if predicted_price:
             st.success(f'The predicted price of the house is ${np.round(predicted_price[0], 2)}')
+            log_prediction(input_data, predicted_price[0])
+            out_of_range = check_drift(input_df, predicted_price)
+            if out_of_range:
+                st.warning(f"{', '.join(out_of_range)} outside the range of the training data, "
+                           "so this prediction may be less reliable.")
+            contributions = explain_price(model, scaler, input_df)
+            if contributions is not None:
+                with st.expander('Why this price?'):
+                    with metrics.timed('figure/explanation_waterfall'):
+                        fig = plot_explanation(contributions)
+                    st.plotly_chart(fig)
         else:
             st.error('Error predicting price')
     st.divider()
 
-# ======================================================================================================================== #
-
-    # # Connect to the database and insert the input and prediction
-    #     connection = create_connection()
-    #     if connection:
-    #         insert_data(connection, bedrooms, bathrooms, sqft_living, sqft_lot, floors, waterfront, view, condition, grade, sqft_above,
-    #                     sqft_basement, yr_built, yr_renovated, lat, long, sqft_living_15, sqft_lot_15, yr_sold, month_sold, house_age, predicted_price)
-    #         connection.close()
-    #         st.success("Data inserted successfully in database.")
-    #     else:
-    #         st.error("Error connecting to the database.")
+    # What-if sensitivity of the price to one or two features of this house
+    st.header('What-if Sensitivity 🔀')
+    st.write('''Choose one or two features to see how the predicted price of this house changes as they vary.''')
+    sweep_features = st.multiselect('Features to vary', list(sensitivity.SWEEP_RANGES), default=['sqft_living'],
+                                    max_selections=2)
+    sweep_points = st.slider('Values per feature', min_value=5, max_value=50, value=25)
+    if sweep_features:
+        result = sensitivity_sweep(model, scaler, input_data, sweep_features, sweep_points)
+        if result is not None:
+            with metrics.timed('figure/sensitivity'):
+                fig = plot_sensitivity(result, sweep_features)
+            st.plotly_chart(fig)
+    st.divider()
 
-    # st.divider()
+    st.sidebar.caption(f"Model: {os.path.relpath(model_path)}")
+    # Artifact cache statistics
+    stats = artifacts.cache_stats()
+    st.sidebar.caption(f"Artifact cache: {stats['hits']} hits / {stats['misses']} loads "
+                       f"({stats['hit_rate']:.0%} hit rate, {stats['load_time']:.2f}s spent loading)")
+    stats = prediction_cache.stats()
+    st.sidebar.caption(f"Prediction cache: {stats['hits']} hits / {stats['misses']} misses "
+                       f"({stats['hit_rate']:.0%} hit rate, {stats['evictions']} evicted)")
+    summary = drift.get_monitor().summary()
+    st.sidebar.caption(f"Drift monitor: {summary['rows']} predictions checked, "
+                       f"drift in {', '.join(summary['drift']) or 'no features'}")
+    stats = get_logger().stats()
+    st.sidebar.caption(f"Prediction log: {stats['written']} saved, {stats['queue_depth']} queued "
+                       f"(mean flush {stats['mean_flush_ms']:.1f} ms, {stats['errors']} errors)")
 
-# ======================================================================================================================== #
 
     # Note
     st.subheader('⚠️Please Note:')
@@ -0,0 +1,254 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+
+# Columns whose price means are plotted on the Visualization page
+GROUP_COLUMNS = ['yr_built', 'yr_renovated', 'date', 'month']
+# Near-unique columns are counted in fixed-width bins instead of per value, so the store grows with
+# each column's range rather than with the number of rows. Other numeric columns (bedrooms, grade,
+# zipcode, ...) have few distinct values and keep exact counts for the count plots
+BIN_WIDTHS = {
+    'id': 10_000_000,
+    'price': 1_000,
+    'sqft_living': 10,
+    'sqft_lot': 100,
+    'sqft_above': 10,
+    'sqft_basement': 10,
+    'lat': 0.0005,
+    'long': 0.0005,
+    'sqft_living15': 10,
+    'sqft_lot15': 100,
+}
+STORE_VERSION = 2
+
+
+def store_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.aggregates.npz'
+
+
+def _moments(values):
+    # Count, mean, sum of squared deviations, min and max: exact and mergeable
+    if not len(values):
+        return np.array([0.0, 0.0, 0.0, np.inf, -np.inf])
+    mean = values.mean()
+    return np.array([len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max()])
+
+
+def _merge_moments(a, b):
+    # Chan et al. parallel update
+    n = a[0] + b[0]
+    if n == 0:
+        return a
+    delta = b[1] - a[1]
+    return np.array([n, a[1] + delta * b[0] / n, a[2] + b[2] + delta ** 2 * a[0] * b[0] / n,
+                     min(a[3], b[3]), max(a[4], b[4])])
+
+
+def compute_aggregates(df):
+    '''
+    Summarise raw sales rows into mergeable aggregates: per-column value counts (per bin for the
+    columns in BIN_WIDTHS, which also keep exact moments), enough to rebuild describe() and every
+    count plot, and price sum/count per group
+    '''
+    numeric = df.select_dtypes('number')
+    value_counts, moments = {}, {}
+    for column in numeric.columns:
+        if column in BIN_WIDTHS:
+            values = numeric[column].dropna().to_numpy(dtype=np.float64)
+            value_counts[column] = pd.Series(np.floor(values / BIN_WIDTHS[column]).astype(np.int64)).value_counts()
+            moments[column] = _moments(values)
+        else:
+            value_counts[column] = numeric[column].value_counts()
+
+    groups = df[['price']].copy()
+    groups['yr_built'] = df['yr_built']
+    groups['yr_renovated'] = df['yr_renovated']
+    # Dates look like 20141013T000000, so the month can be sliced out without parsing
+    groups['date'] = df['date'].astype(str).str[:8]
+    groups['month'] = groups['date'].str[4:6].astype(int)
+    price_by = {column: groups.groupby(column)['price'].agg(['sum', 'count']) for column in GROUP_COLUMNS}
+
+    return {'rows': len(df), 'value_counts': value_counts, 'moments': moments, 'price_by': price_by}
+
+
+def _merge_series(old, new, merge):
+    # A column missing on either side (e.g. parsed as text in one chunk) keeps the other side's values
+    return {column: merge(old[column], new[column]) if column in old and column in new
+            else old.get(column, new.get(column)) for column in {**old, **new}}
+
+
+def merge_aggregates(old, new):
+    '''
+    Combine the aggregates of two disjoint sets of rows
+    '''
+    return {
+        'rows': old['rows'] + new['rows'],
+        'value_counts': _merge_series(old['value_counts'], new['value_counts'],
+                                      lambda a, b: a.add(b, fill_value=0).astype(np.int64)),
+        'moments': _merge_series(old['moments'], new['moments'], _merge_moments),
+        'price_by': _merge_series(old['price_by'], new['price_by'], lambda a, b: a.add(b, fill_value=0)),
+    }
+
+
+def _hash_prefix(csv_path, length):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(csv_path, 'rb') as f:
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def save_aggregates(aggregates, file_path):
+    arrays = {'store_version': STORE_VERSION, 'rows': aggregates['rows'],
+              'offset': aggregates['offset'], 'prefix_hash': aggregates['prefix_hash'],
+              'columns': np.array(aggregates['columns'])}
+    for column, counts in aggregates['value_counts'].items():
+        arrays[f'vc_values/{column}'] = counts.index.to_numpy()
+        arrays[f'vc_counts/{column}'] = counts.to_numpy()
+    for column, values in aggregates['moments'].items():
+        arrays[f'mo/{column}'] = values
+    for column, stats in aggregates['price_by'].items():
+        arrays[f'pb_keys/{column}'] = stats.index.to_numpy().astype(str if column == 'date' else np.int64)
+        arrays[f'pb_sum/{column}'] = stats['sum'].to_numpy()
+        arrays[f'pb_count/{column}'] = stats['count'].to_numpy()
+    np.savez_compressed(file_path, **arrays)
+
+
+def load_stored_aggregates(file_path):
+    with np.load(file_path) as arrays:
+        if int(arrays['store_version']) != STORE_VERSION:
+            return None
+        value_counts, moments, price_by = {}, {}, {}
+        for name in arrays.files:
+            if name.startswith('mo/'):
+                moments[name.split('/', 1)[1]] = arrays[name]
+            if name.startswith('vc_values/'):
+                column = name.split('/', 1)[1]
+                value_counts[column] = pd.Series(arrays[f'vc_counts/{column}'], index=arrays[name], name='count')
+            elif name.startswith('pb_keys/'):
+                column = name.split('/', 1)[1]
+                price_by[column] = pd.DataFrame(
+                    {'sum': arrays[f'pb_sum/{column}'], 'count': arrays[f'pb_count/{column}']},
+                    index=pd.Index(arrays[name], name=column))
+        return {
+            'rows': int(arrays['rows']),
+            'offset': int(arrays['offset']),
+            'prefix_hash': str(arrays['prefix_hash']),
+            'columns': arrays['columns'].tolist(),
+            'value_counts': value_counts,
+            'moments': moments,
+            'price_by': price_by,
+        }
+
+
+def load_summary(csv_path):
+    '''
+    Return the aggregates of a sales CSV, reusing the on-disk store when it is current.
+    When rows have only been appended to the CSV, just the new rows are read and merged in
+    '''
+    with metrics.timed('aggregates_load'):
+        return _load_summary(csv_path)
+
+
+def _load_summary(csv_path):
+    path = store_path(csv_path)
+    size = os.path.getsize(csv_path)
+    stored = load_stored_aggregates(path) if os.path.exists(path) else None
+
+    if stored is not None and stored['offset'] <= size and _hash_prefix(csv_path, stored['offset']) == stored['prefix_hash']:
+        if stored['offset'] == size:
+            return stored
+        with open(csv_path, 'rb') as f:
+            f.seek(stored['offset'])
+            tail = f.read()
+        # Only whole lines are consumed; a partially written last line is picked up next time
+        tail = tail[:tail.rfind(b'\n') + 1]
+        if not tail:
+            return stored
+        new_rows = pd.read_csv(io.BytesIO(tail), header=None, names=stored['columns'])
+        aggregates = merge_aggregates(stored, compute_aggregates(new_rows))
+        aggregates['columns'] = stored['columns']
+        offset = stored['offset'] + len(tail)
+    else:
+        with open(csv_path, 'rb') as f:
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        df = pd.read_csv(io.BytesIO(data))
+        aggregates = compute_aggregates(df)
+        aggregates['columns'] = df.columns.tolist()
+        offset = len(data)
+
+    aggregates['offset'] = offset
+    aggregates['prefix_hash'] = _hash_prefix(csv_path, offset)
+    try:
+        save_aggregates(aggregates, path)
+    except OSError:
+        # A read-only deployment still gets the aggregates, just without persisting them
+        pass
+    return aggregates
+
+
+def _values(aggregates, column):
+    # Values and counts of a column, sorted; bin centres (clipped to the observed range) for binned columns
+    counts = aggregates['value_counts'][column].sort_index()
+    values = counts.index.to_numpy(dtype=np.float64)
+    if column in aggregates['moments']:
+        _, _, _, low, high = aggregates['moments'][column]
+        values = np.clip((values + 0.5) * BIN_WIDTHS[column], low, high)
+    return values, counts.to_numpy(dtype=np.float64)
+
+
+def describe(aggregates):
+    '''
+    Rebuild DataFrame.describe() for the numeric columns from their value counts. Count, mean,
+    std, min and max are exact; quartiles of binned columns are accurate to half a bin width
+    '''
+    stats = {}
+    for column in aggregates['value_counts']:
+        values, weights = _values(aggregates, column)
+        if column in aggregates['moments']:
+            n, mean, m2, low, high = aggregates['moments'][column]
+        else:
+            n = weights.sum()
+            mean = (values * weights).sum() / n
+            m2 = (weights * (values - mean) ** 2).sum()
+            low, high = values[0], values[-1]
+        std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+        # Linear interpolation between order statistics, as pandas does
+        cumulative = np.cumsum(weights)
+        quantiles = []
+        for q in (0.25, 0.5, 0.75):
+            position = q * (n - 1)
+            lower = values[np.searchsorted(cumulative, np.floor(position), side='right')]
+            upper = values[np.searchsorted(cumulative, np.ceil(position), side='right')]
+            quantiles.append(lower + (upper - lower) * (position - np.floor(position)))
+        stats[column] = [n, mean, std, low, *quantiles, high]
+    return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+
+def value_counts(aggregates, column):
+    '''
+    Counts of each value of a column, most frequent first, shaped like value_counts().reset_index().
+    Binned columns are counted per bin, at the bin centre
+    '''
+    values, counts = _values(aggregates, column)
+    order = np.argsort(-counts, kind='stable')
+    return pd.DataFrame({column: values[order], 'count': counts[order].astype(np.int64)})
+
+
+def mean_price_by(aggregates, column):
+    '''
+    Mean price per value of a group column, shaped like groupby(column)['price'].mean().reset_index()
+    '''
+    stats = aggregates['price_by'][column].sort_index()
+    return pd.DataFrame({column: stats.index, 'price': (stats['sum'] / stats['count']).to_numpy()})
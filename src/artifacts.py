@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import joblib
+
+from src import metrics, storage
+
+MODEL_PATH = 'artifacts/xgb_model.pkl'
+SCALER_PATH = 'artifacts/scaler.pkl'
+PROCESSED_DATA_PATH = 'notebooks/data/processed_data.csv'
+RAW_DATA_PATH = 'notebooks/data/kc_house_data.csv'
+
+# Process-wide cache of loaded artifacts. Streamlit re-executes page scripts on every
+# widget interaction, but imported modules stay in sys.modules, so everything stored
+# here is shared by all reruns and all sessions of one server process.
+_cache = {}
+_lock = threading.Lock()
+# One lock per artifact, held while it loads
+_load_locks = {}
+_stats = {'hits': 0, 'misses': 0, 'load_time': 0.0}
+# Values derived from a file (e.g. figures), kept for the most recently used keys
+_derived = OrderedDict()
+MAX_DERIVED = 128
+
+
+def _fingerprint(file_path):
+    '''
+    Identify the version of a file on disk by its modification time and size
+    '''
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_artifact(file_path, loader=joblib.load):
+    '''
+    Load an artifact once per process and reuse it until the file on disk changes.
+    The same file read by different loaders (e.g. a CSV and its summary) is cached separately
+    '''
+    path = os.path.abspath(file_path)
+    key = (path, loader)
+    fingerprint = _fingerprint(path)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            _stats['hits'] += 1
+            entry['hits'] += 1
+            return entry['value']
+        key_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Loaded outside the cache lock so cache hits for other artifacts never wait on a slow load.
+    # Concurrent callers of this artifact wait for the first one and reuse what it loaded
+    with key_lock:
+        with _lock:
+            entry = _cache.get(key)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                _stats['hits'] += 1
+                entry['hits'] += 1
+                return entry['value']
+
+        start = time.perf_counter()
+        with metrics.timed('artifact_load'):
+            value = loader(path)
+        load_time = time.perf_counter() - start
+
+        with _lock:
+            _stats['misses'] += 1
+            _stats['load_time'] += load_time
+            _cache[key] = {
+                'value': value,
+                'fingerprint': fingerprint,
+                'load_time': load_time,
+                'hits': 0,
+            }
+        return value
+
+
+def artifact_version(file_path, loader=None):
+    '''
+    Return the fingerprint of the cached copy of an artifact (as read by loader, or by any
+    loader if None), or None if it is not loaded
+    '''
+    path = os.path.abspath(file_path)
+    with _lock:
+        for (cached_path, cached_loader), entry in _cache.items():
+            if cached_path == path and loader in (None, cached_loader):
+                return entry['fingerprint']
+    return None
+
+
+def memoize(file_path, key, build):
+    '''
+    Return build() computed once per version of file_path and key, e.g. a figure drawn from a
+    dataset with a given set of options. Rebuilt when the file changes; least recently used
+    keys are dropped beyond MAX_DERIVED
+    '''
+    cache_key = (os.path.abspath(file_path), key)
+    fingerprint = _fingerprint(file_path)
+    with _lock:
+        entry = _derived.get(cache_key)
+        if entry is not None and entry[0] == fingerprint:
+            _derived.move_to_end(cache_key)
+            return entry[1]
+    # Built outside the lock so other sessions are not blocked; a concurrent duplicate build is harmless
+    value = build()
+    with _lock:
+        _derived[cache_key] = (fingerprint, value)
+        _derived.move_to_end(cache_key)
+        while len(_derived) > MAX_DERIVED:
+            _derived.popitem(last=False)
+    return value
+
+
+def load_model(file_path):
+    return load_artifact(file_path, joblib.load)
+
+
+def load_scaler(file_path):
+    return load_artifact(file_path, joblib.load)
+
+
+def save_artifact(value, file_path):
+    '''
+    Pickle value to file_path through a temporary file and a rename, so a process loading the
+    artifact concurrently never reads a half-written file
+    '''
+    # Unique per writer, so two threads or processes saving the same artifact do not share a temporary file
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    joblib.dump(value, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def load_processed_data(file_path):
+    # Callers share the same DataFrame object, so they must copy it before mutating it
+    return load_artifact(file_path, storage.read_dataset)
+
+
+def cache_stats():
+    '''
+    Return hit/miss counters, hit rate and load times of the artifact cache
+    '''
+    with _lock:
+        calls = _stats['hits'] + _stats['misses']
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'hit_rate': _stats['hits'] / calls if calls else 0.0,
+            'load_time': _stats['load_time'],
+            'artifacts': {
+                f"{os.path.relpath(path)} ({loader.__name__})": {'load_time': entry['load_time'], 'hits': entry['hits']}
+                for (path, loader), entry in _cache.items()
+            },
+        }
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _derived.clear()
+        _stats.update({'hits': 0, 'misses': 0, 'load_time': 0.0})
@@ -0,0 +1,209 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import artifacts
+from src.features import build_features
+from src.predict import FEATURE_COLUMNS, predict_frame
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _is_parquet(file_path):
+    return os.path.splitext(file_path)[1].lower() in ('.parquet', '.pq')
+
+
+def read_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, raw=False):
+    '''
+    Yield the input file as DataFrames of at most chunk_size rows.
+    With raw=True the input holds raw kc_house_data rows and the model features are derived per chunk
+    '''
+    chunks = _read_file_chunks(file_path, chunk_size)
+    if not raw:
+        yield from chunks
+        return
+    for chunk in chunks:
+        features = build_features(chunk)
+        # Keep the identifying raw columns next to the features in the output
+        for column in ('date', 'id'):
+            if column in chunk.columns:
+                features.insert(0, column, chunk[column].to_numpy())
+        yield features
+
+
+def _read_file_chunks(file_path, chunk_size):
+    if _is_parquet(file_path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_path, chunksize=chunk_size, dtype={'date': str})
+
+
+class ChunkWriter:
+    '''
+    Append scored chunks to a CSV or Parquet file without keeping earlier chunks in memory
+    '''
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.parquet = _is_parquet(file_path)
+        self._writer = None
+        self._first = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.file_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.file_path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Model and scaler of a pool worker, loaded once by _init_worker and reused for every chunk
+_worker = {}
+
+
+def _init_worker(model_path, scaler_path):
+    model = artifacts.load_model(model_path)
+    # Each worker owns one core; letting every worker start its own thread pool oversubscribes the CPU.
+    # Registry bundles may hold any of the notebook's regressors, not only XGBoost
+    if hasattr(model, 'get_booster'):
+        model.get_booster().set_param({'nthread': 1})
+    elif hasattr(model, 'n_jobs'):
+        model.n_jobs = 1
+    _worker['model'] = model
+    _worker['scaler'] = artifacts.load_scaler(scaler_path)
+
+
+def _score_chunk(features):
+    return predict_frame(_worker['model'], _worker['scaler'], features)
+
+
+def create_pool(workers, model_path=artifacts.MODEL_PATH, scaler_path=artifacts.SCALER_PATH):
+    '''
+    Start a process pool whose workers each load the model and scaler once
+    '''
+    # Spawned rather than forked: forking a process that has already run xgboost's OpenMP
+    # thread pool can deadlock the children
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(model_path, scaler_path),
+    )
+
+
+def _score_in_order(chunks, pool, max_pending):
+    '''
+    Score chunks on the pool and yield (chunk, predictions) in input order,
+    keeping at most max_pending chunks in flight
+    '''
+    pending = deque()
+    for chunk in chunks:
+        # Only the feature columns are sent to the workers
+        pending.append((chunk, pool.submit(_score_chunk, chunk[FEATURE_COLUMNS])))
+        if len(pending) >= max_pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    while pending:
+        chunk, future = pending.popleft()
+        yield chunk, future.result()
+
+
+def predict_parallel(df, workers=None, chunk_size=10_000, pool=None,
+                     model_path=artifacts.MODEL_PATH, scaler_path=artifacts.SCALER_PATH):
+    '''
+    Predict a large DataFrame by splitting it across a pool of worker processes.
+    Predictions are returned in the same order as the rows of df
+    '''
+    chunks = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    own_pool = pool is None
+    workers = workers or os.cpu_count()
+    if own_pool:
+        pool = create_pool(workers, model_path, scaler_path)
+    try:
+        # Bounded like score_file, so the frame is not copied into the pool queue all at once
+        predictions = [result for _, result in _score_in_order(chunks, pool, max_pending=2 * workers)]
+    finally:
+        if own_pool:
+            pool.shutdown()
+    return np.concatenate(predictions) if predictions else np.empty(0, dtype=np.float32)
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE,
+               model_path=artifacts.MODEL_PATH, scaler_path=artifacts.SCALER_PATH, workers=1, raw=False, verbose=True):
+    '''
+    Stream input_path through the model and write it to output_path with a predicted_price column.
+    With workers > 1 the chunks are scored on a process pool and written back in input order
+    '''
+    rows = 0
+    start = time.perf_counter()
+    pool = None
+    if workers > 1:
+        pool = create_pool(workers, model_path, scaler_path)
+        # Two chunks per worker keeps every core busy while bounding memory
+        scored = _score_in_order(read_chunks(input_path, chunk_size, raw), pool, max_pending=2 * workers)
+    else:
+        model = artifacts.load_model(model_path)
+        scaler = artifacts.load_scaler(scaler_path)
+        scored = ((chunk, predict_frame(model, scaler, chunk)) for chunk in read_chunks(input_path, chunk_size, raw))
+
+    try:
+        with ChunkWriter(output_path) as writer:
+            for chunk, predictions in scored:
+                chunk['predicted_price'] = predictions
+                writer.write(chunk)
+                rows += len(chunk)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"{rows} rows scored, {rows / elapsed:,.0f} rows/sec", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_sec': rows / elapsed if elapsed else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of houses in chunks')
+    parser.add_argument('input', help='CSV or Parquet file with the 20 model feature columns')
+    parser.add_argument('output', help='CSV or Parquet file to write, with a predicted_price column added')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows scored per chunk')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes to score chunks in parallel')
+    parser.add_argument('--raw', action='store_true', help='input holds raw kc_house_data rows instead of model features')
+    parser.add_argument('--model', default=artifacts.MODEL_PATH, help='path to the pickled model')
+    parser.add_argument('--scaler', default=artifacts.SCALER_PATH, help='path to the pickled scaler')
+    args = parser.parse_args(argv)
+
+    result = score_file(args.input, args.output, args.chunk_size, args.model, args.scaler, args.workers, args.raw)
+    print(f"Scored {result['rows']} rows in {result['seconds']:.2f}s ({result['rows_per_sec']:,.0f} rows/sec)")
+
+
+if __name__ == '__main__':
+    main()
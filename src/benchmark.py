@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import aggregates, artifacts, downsample, startup
+from src.predict import FEATURE_COLUMNS, predict_frame
+
+BASELINE_PATH = 'benchmarks/baseline.json'
+BATCH_SIZES = [1, 100, 10_000, 100_000]
+COUNT_COLUMNS = ['floors', 'bedrooms', 'grade', 'condition', 'waterfront', 'view']
+PAGES = {'home': 'Home.py', 'visualization': 'pages/1_Visualization.py', 'prediction': 'pages/2_Prediction.py'}
+
+
+def measure(fn, repeat=5):
+    '''
+    Median wall time of fn over repeat calls, in seconds
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def synthetic_sales(raw, scale, random_state=0):
+    '''
+    Scale the raw sales up by replicating rows with small noise on price and location
+    '''
+    if scale == 1:
+        return raw
+    rng = np.random.default_rng(random_state)
+    df = raw.iloc[np.tile(np.arange(len(raw)), scale)].reset_index(drop=True)
+    df['id'] = np.arange(len(df))
+    df['price'] = (df['price'] * rng.normal(1, 0.05, len(df))).round()
+    df['lat'] = df['lat'] + rng.normal(0, 0.001, len(df))
+    df['long'] = df['long'] + rng.normal(0, 0.001, len(df))
+    return df
+
+
+def bench_loading():
+    # Cold loads run in a fresh interpreter so imports and unpickling are counted
+    code = ('import time; start = time.perf_counter(); from src import artifacts; '
+            'artifacts.load_model(artifacts.MODEL_PATH); artifacts.load_scaler(artifacts.SCALER_PATH); '
+            'print(time.perf_counter() - start)')
+    cold = [float(subprocess.run([sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True,
+                                 check=True).stdout) for _ in range(3)]
+    artifacts.load_model(artifacts.MODEL_PATH)
+    artifacts.load_scaler(artifacts.SCALER_PATH)
+    return {
+        'load/artifacts_cold': statistics.median(cold),
+        'load/artifacts_warm': measure(lambda: (artifacts.load_model(artifacts.MODEL_PATH),
+                                                artifacts.load_scaler(artifacts.SCALER_PATH)), repeat=100),
+    }
+
+
+def bench_pages():
+    '''
+    Time to first paint of each Streamlit page, i.e. one full script run under AppTest: in a fresh
+    interpreter (cold imports and caches) and as a rerun in a warm process
+    '''
+    from streamlit.testing.v1 import AppTest
+
+    code = ('import sys, time; from streamlit.testing.v1 import AppTest; '
+            'at = AppTest.from_file(sys.argv[1], default_timeout=300); '
+            'start = time.perf_counter(); at.run(); print(time.perf_counter() - start)')
+    results = {}
+    for name, page in PAGES.items():
+        page = os.path.abspath(page)
+        cold = [float(subprocess.run([sys.executable, '-W', 'ignore', '-c', code, page], capture_output=True, text=True,
+                                     check=True).stdout.split()[-1]) for _ in range(3)]
+        AppTest.from_file(page, default_timeout=300).run()
+        results[f'page/{name}_cold'] = statistics.median(cold)
+        results[f'page/{name}_warm'] = measure(lambda: AppTest.from_file(page, default_timeout=300).run())
+    return results
+
+
+def bench_imports(top=10):
+    '''
+    Cold import time of each page's imports in a fresh interpreter, in total and for its most
+    expensive packages
+    '''
+    results = {}
+    for name, page in PAGES.items():
+        packages, total = startup.import_breakdown(startup.script_imports(page))
+        results[f'import/{name}'] = total / 1000
+        for package, milliseconds in packages[:top]:
+            results[f'import/{name}/{package}'] = milliseconds / 1000
+    return results
+
+
+def bench_prediction(features):
+    model = artifacts.load_model(artifacts.MODEL_PATH)
+    scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    results = {}
+    record = features.iloc[0].to_dict()
+    # The Prediction page path: a one-row DataFrame built from the input dict
+    results['predict/single_row'] = measure(lambda: predict_frame(model, scaler, pd.DataFrame([record])), repeat=50)
+    for batch_size in BATCH_SIZES[1:]:
+        batch = features.iloc[np.arange(batch_size) % len(features)]
+        results[f'predict/batch_{batch_size}'] = measure(lambda: predict_frame(model, scaler, batch), repeat=3)
+    return results
+
+
+def bench_visualization(df, csv_path, prefix):
+    '''
+    Time reading the CSV and every summary the Visualization page computes, both directly
+    on the DataFrame and through the aggregate store
+    '''
+    results = {f'{prefix}/read_csv': measure(lambda: pd.read_csv(csv_path), repeat=3)}
+    results[f'{prefix}/describe'] = measure(df.describe, repeat=3)
+    for column in COUNT_COLUMNS:
+        results[f'{prefix}/value_counts_{column}'] = measure(lambda: df[column].value_counts(), repeat=3)
+    for column in ('yr_built', 'yr_renovated'):
+        results[f'{prefix}/groupby_{column}'] = measure(lambda: df.groupby(column)['price'].mean(), repeat=3)
+    results[f'{prefix}/to_datetime_copy'] = measure(lambda: pd.to_datetime(df.copy()['date']), repeat=3)
+    dated = df.assign(date=pd.to_datetime(df['date']))
+    results[f'{prefix}/groupby_date'] = measure(lambda: dated.groupby('date')['price'].mean(), repeat=3)
+    results[f'{prefix}/groupby_month'] = measure(lambda: dated.groupby(dated['date'].dt.month)['price'].mean(), repeat=3)
+    results[f'{prefix}/hex_bin_map'] = measure(lambda: downsample.hex_bin(df, downsample.hex_size_for_zoom(10)), repeat=3)
+    results[f'{prefix}/density_bins'] = measure(lambda: downsample.density_bins(df, 'sqft_living', 'price', 80), repeat=3)
+
+    store = aggregates.store_path(csv_path)
+    if os.path.exists(store):
+        os.remove(store)
+    results[f'{prefix}/aggregates_build'] = measure(lambda: aggregates.load_summary(csv_path), repeat=1)
+    results[f'{prefix}/aggregates_load'] = measure(lambda: aggregates.load_summary(csv_path), repeat=3)
+    summary = aggregates.load_summary(csv_path)
+    results[f'{prefix}/aggregates_describe'] = measure(lambda: aggregates.describe(summary), repeat=3)
+    return results
+
+
+def run(scales=(1, 10), verbose=True):
+    raw = pd.read_csv(artifacts.RAW_DATA_PATH)
+    features = artifacts.load_processed_data(artifacts.PROCESSED_DATA_PATH)[FEATURE_COLUMNS]
+    results = {}
+    benches = (('loading', bench_loading), ('prediction', lambda: bench_prediction(features)),
+               ('imports', bench_imports), ('pages', bench_pages))
+    for name, bench in benches:
+        if verbose:
+            print(f"Benchmarking {name}...", file=sys.stderr)
+        results.update(bench())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            if verbose:
+                print(f"Benchmarking visualization at {scale}x...", file=sys.stderr)
+            df = synthetic_sales(raw, scale)
+            csv_path = os.path.join(tmp, f'sales_{scale}x.csv')
+            df.to_csv(csv_path, index=False)
+            results.update(bench_visualization(df, csv_path, f'visualization_{scale}x'))
+    return results
+
+
+def compare(results, baseline, tolerance=0.5, min_seconds=0.001):
+    '''
+    Benchmarks slower than the baseline by more than tolerance. Timings under min_seconds in
+    both runs are too noisy to compare and are skipped
+    '''
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base is None or max(seconds, base) < min_seconds:
+            continue
+        if seconds > base * (1 + tolerance):
+            regressions.append({'benchmark': name, 'baseline': base, 'current': seconds, 'ratio': seconds / base})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Performance benchmarks for loading, prediction, imports, page rendering and the Visualization page')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='synthetic dataset sizes as multiples of kc_house_data.csv')
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown against the baseline (0.5 = 50%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.scales)
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, seconds in results.items():
+        print(f"{name:50s} {seconds * 1000:12.3f} ms")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']}: {regression['baseline'] * 1000:.3f} ms -> "
+              f"{regression['current'] * 1000:.3f} ms ({regression['ratio']:.2f}x)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src import artifacts
+from src.predict import FEATURE_COLUMNS
+
+COMPILED_MODEL_PATH = 'artifacts/xgb_model_compiled.npz'
+
+
+class CompiledModel:
+    '''
+    Array-backed copy of the boosted trees with the StandardScaler folded into the split
+    thresholds. Predicts from raw (unscaled) features with NumPy only, without importing
+    xgboost or scikit-learn.
+
+    Every tree is padded to the same number of nodes, so a batch is evaluated by walking
+    all trees one level at a time. Leaves point to themselves, so rows that reach a leaf
+    early simply stay there.
+    '''
+
+    def __init__(self, feature, threshold, left, right, default_left, value, base_score, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.base_score = float(base_score)
+        self.depth = int(depth)
+        # Flattened views used by the evaluator; child ids are global so no per-tree offset is needed
+        offset = (np.arange(feature.shape[0], dtype=np.int64) * feature.shape[1])[:, None]
+        self._feature = feature.astype(np.int64).ravel()
+        self._threshold = threshold.ravel()
+        self._default_left = default_left.ravel()
+        self._value = value.ravel()
+        self._children = np.stack([left + offset, right + offset], axis=-1).ravel()
+
+    @classmethod
+    def load(cls, file_path=COMPILED_MODEL_PATH):
+        with np.load(file_path) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def save(self, file_path=COMPILED_MODEL_PATH):
+        np.savez(file_path, feature=self.feature, threshold=self.threshold, left=self.left,
+                 right=self.right, default_left=self.default_left, value=self.value,
+                 base_score=self.base_score, depth=self.depth)
+
+    def predict(self, X, chunk_size=256):
+        '''
+        Predict raw feature rows given as a DataFrame or an array in FEATURE_COLUMNS order
+        '''
+        if hasattr(X, 'columns'):
+            X = X[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        out = np.empty(len(X), dtype=np.float32)
+        # Chunked so the (trees x rows) node matrix stays small
+        for start in range(0, len(X), chunk_size):
+            out[start:start + chunk_size] = self._predict_chunk(X[start:start + chunk_size])
+        return out
+
+    def _predict_chunk(self, X):
+        # Flat 1-D lookups (np.take) are much cheaper than 2-D fancy indexing
+        n_trees, n_nodes = self.feature.shape
+        columns = np.ascontiguousarray(X.T).ravel()
+        row_offset = np.arange(len(X), dtype=np.int64)
+        node = np.repeat(np.arange(n_trees, dtype=np.int64) * n_nodes, len(X)).reshape(n_trees, len(X))
+        for _ in range(self.depth):
+            values = columns.take(self._feature.take(node) * len(X) + row_offset)
+            go_right = ~(values < self._threshold.take(node))
+            # Missing values follow the default branch chosen at training time
+            missing = np.isnan(values)
+            if missing.any():
+                go_right = np.where(missing, ~self._default_left.take(node), go_right)
+            node = self._children.take(node * 2 + go_right)
+        return self._value.take(node).sum(axis=0, dtype=np.float64) + self.base_score
+
+
+def raw_thresholds(threshold, mean, scale):
+    '''
+    Map float32 split thresholds on scaled features to thresholds on raw features.
+
+    xgboost sends a row left when float32((x - mean) / scale) < threshold. Splits often sit
+    exactly on a training value, so threshold * scale + mean is not precise enough; instead
+    bisect for the smallest raw value that goes right, giving raw x < folded <=> scaled x < threshold.
+    '''
+    def goes_right(raw):
+        return ((raw - mean) / scale).astype(np.float32) >= threshold
+
+    guess = threshold.astype(np.float64) * scale + mean
+    step = np.abs(scale) * (np.spacing(np.abs(threshold)) * 4 + 1e-30) + np.spacing(np.abs(guess)) * 4
+    lo, hi = guess - step, guess + step
+    for _ in range(128):
+        mid = lo + (hi - lo) / 2
+        right = goes_right(mid)
+        hi = np.where(right, mid, hi)
+        lo = np.where(right, lo, mid)
+    return hi
+
+
+def compile_model(model, scaler):
+    '''
+    Build a CompiledModel from a fitted XGBRegressor and the StandardScaler applied before it
+    '''
+    learner = json.loads(model.get_booster().save_raw(raw_format='json'))['learner']
+    trees = learner['gradient_booster']['model']['trees']
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+
+    n_nodes = max(len(tree['left_children']) for tree in trees)
+    shape = (len(trees), n_nodes)
+    feature = np.zeros(shape, dtype=np.int32)
+    threshold = np.zeros(shape, dtype=np.float64)
+    left = np.tile(np.arange(n_nodes, dtype=np.int32), (len(trees), 1))
+    right = left.copy()
+    default_left = np.zeros(shape, dtype=bool)
+    value = np.zeros(shape, dtype=np.float32)
+
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    depth = 0
+    for t, tree in enumerate(trees):
+        node_depth = np.zeros(len(tree['left_children']), dtype=np.int32)
+        for i, (l, r) in enumerate(zip(tree['left_children'], tree['right_children'])):
+            if l == -1:
+                value[t, i] = tree['split_conditions'][i]
+                continue
+            feature[t, i] = tree['split_indices'][i]
+            threshold[t, i] = tree['split_conditions'][i]
+            left[t, i], right[t, i] = l, r
+            default_left[t, i] = bool(tree['default_left'][i])
+            node_depth[l] = node_depth[r] = node_depth[i] + 1
+        depth = max(depth, int(node_depth.max()))
+
+    split = left != np.arange(n_nodes)
+    f = feature[split]
+    threshold[split] = raw_thresholds(threshold[split].astype(np.float32), mean[f], scale[f])
+
+    return CompiledModel(feature, threshold, left, right, default_left, value, base_score, depth)
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(compiled, model, scaler, data, batch_sizes=(1, 1000, 100_000)):
+    '''
+    Compare predictions and timings of the compiled model against scaler + XGBRegressor
+    '''
+    from src.predict import predict_frame
+
+    features = data[FEATURE_COLUMNS]
+    reference = predict_frame(model, scaler, features)
+    diff = np.abs(compiled.predict(features) - reference)
+    results = {'max_abs_diff': float(diff.max()), 'max_rel_diff': float((diff / np.abs(reference)).max()), 'timings': []}
+    for batch_size in batch_sizes:
+        batch = features.sample(batch_size, replace=batch_size > len(features), random_state=0)
+        repeat = max(1, 2000 // batch_size)
+        results['timings'].append({
+            'batch_size': batch_size,
+            'xgboost_s': _time(lambda: predict_frame(model, scaler, batch), repeat),
+            'compiled_s': _time(lambda: compiled.predict(batch), repeat),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile the model and scaler into a NumPy-only inference engine')
+    parser.add_argument('command', choices=['export', 'benchmark'])
+    parser.add_argument('--model', default=artifacts.MODEL_PATH)
+    parser.add_argument('--scaler', default=artifacts.SCALER_PATH)
+    parser.add_argument('--output', default=COMPILED_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    model = artifacts.load_model(args.model)
+    scaler = artifacts.load_scaler(args.scaler)
+    compiled = compile_model(model, scaler)
+    if args.command == 'export':
+        compiled.save(args.output)
+        print(f"Wrote {compiled.feature.shape[0]} trees (depth {compiled.depth}) to {args.output}")
+    else:
+        data = artifacts.load_processed_data(artifacts.PROCESSED_DATA_PATH)
+        print(json.dumps(benchmark(compiled, model, scaler, data), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from src import artifacts
+
+COMPS_INDEX_PATH = 'artifacts/comps_index.pkl'
+
+# Index features and their relative weights: location dominates, then size and quality
+COMPS_FEATURES = {
+    'lat': 3.0,
+    'long': 3.0,
+    'sqft_living': 1.0,
+    'grade': 1.0,
+    'bedrooms': 0.5,
+    'bathrooms': 0.5,
+}
+# Columns returned for each comparable sale
+RESULT_COLUMNS = ['id', 'date', 'price', 'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'grade',
+                  'yr_built', 'lat', 'long', 'sqft_living15', 'sqft_lot15']
+
+
+class CompsIndex:
+    '''
+    KD-tree over standardised, weighted location and key features of past sales
+    '''
+
+    def __init__(self, sales, features=COMPS_FEATURES, source_version=None, leaf_size=40):
+        self.features = dict(features)
+        self.sales = sales[[column for column in RESULT_COLUMNS if column in sales.columns]].reset_index(drop=True)
+        values = sales[list(self.features)].to_numpy(dtype=np.float64)
+        self.mean = values.mean(axis=0)
+        self.scale = values.std(axis=0) / np.array(list(self.features.values()))
+        self.source_version = source_version
+        self.tree = KDTree(self._transform(values), leaf_size=leaf_size)
+
+    def _transform(self, values):
+        return (values - self.mean) / self.scale
+
+    def query_batch(self, queries, k=5):
+        '''
+        Distances and positions (into self.sales) of the k nearest sales for each query, given as a
+        DataFrame or as an array with the index features in order
+        '''
+        if hasattr(queries, 'columns'):
+            queries = queries[list(self.features)].to_numpy(dtype=np.float64)
+        return self.tree.query(self._transform(np.atleast_2d(queries)), k=k)
+
+    def query(self, record, k=5):
+        '''
+        The k most similar past sales to one house given as a dict, nearest first
+        '''
+        # Built directly from the dict: a one-row DataFrame would cost more than the tree search
+        distances, positions = self.query_batch(np.array([[record[feature] for feature in self.features]], dtype=np.float64), k)
+        comps = self.sales.iloc[positions[0]].copy()
+        comps.insert(0, 'distance', distances[0])
+        return comps.reset_index(drop=True)
+
+    def save(self, file_path=COMPS_INDEX_PATH):
+        # Plain state rather than the instance, so the file loads no matter which module built it
+        # Written atomically: the warmup thread and a page may build and save the index at the same time
+        artifacts.save_artifact({name: getattr(self, name) for name in ('features', 'sales', 'mean', 'scale', 'source_version', 'tree')},
+                                file_path)
+
+    @classmethod
+    def load(cls, file_path=COMPS_INDEX_PATH):
+        index = cls.__new__(cls)
+        index.__dict__.update(joblib.load(file_path))
+        return index
+
+
+def build_index(csv_path=artifacts.RAW_DATA_PATH, index_path=COMPS_INDEX_PATH):
+    sales = pd.read_csv(csv_path, dtype={'id': str, 'date': str})
+    index = CompsIndex(sales, source_version=os.stat(csv_path).st_mtime_ns)
+    index.save(index_path)
+    return index
+
+
+def load_index(csv_path=artifacts.RAW_DATA_PATH, index_path=COMPS_INDEX_PATH):
+    '''
+    Load the persisted index, rebuilding it when it is missing or older than the sales data
+    '''
+    if os.path.exists(index_path):
+        index = artifacts.load_artifact(index_path, CompsIndex.load)
+        if index.source_version == os.stat(csv_path).st_mtime_ns:
+            return index
+    build_index(csv_path, index_path)
+    return artifacts.load_artifact(index_path, CompsIndex.load)
+
+
+def suggest_neighbourhood(comps):
+    '''
+    Median living and lot area of the comparable sales, as a stand-in for sqft_living15/sqft_lot15
+    '''
+    return {'sqft_living15': int(comps['sqft_living'].median()), 'sqft_lot15': int(comps['sqft_lot'].median())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or benchmark the comparable-sales index')
+    parser.add_argument('command', choices=['build', 'benchmark'])
+    parser.add_argument('--data', default=artifacts.RAW_DATA_PATH)
+    parser.add_argument('--index', default=COMPS_INDEX_PATH)
+    parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = build_index(args.data, args.index) if args.command == 'build' else load_index(args.data, args.index)
+    print(f"Index of {len(index.sales)} sales ready in {time.perf_counter() - start:.2f}s")
+    if args.command == 'benchmark':
+        queries = index.sales.sample(1000, random_state=0)
+        start = time.perf_counter()
+        for record in queries.head(200).to_dict(orient='records'):
+            index.query(record, args.k)
+        single = (time.perf_counter() - start) / 200
+        start = time.perf_counter()
+        index.query_batch(queries, args.k)
+        batch = (time.perf_counter() - start) / len(queries)
+        print(f"Single query: {single * 1000:.3f} ms, batched: {batch * 1000:.3f} ms per query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+SQRT3 = np.sqrt(3)
+
+
+def hex_size_for_zoom(zoom, cell_pixels=24):
+    '''
+    Hexagon size in degrees of longitude so that a cell spans about cell_pixels on a web map
+    '''
+    return cell_pixels * 360 / (256 * 2 ** zoom)
+
+
+def hex_bin(df, size, lat='lat', lon='long', value='price', max_bins=5000):
+    '''
+    Aggregate points into hexagonal cells of the given size (degrees), returning one row per
+    non-empty cell with its centre, point count and mean value. The cell size is doubled
+    until there are at most max_bins cells, so the result stays bounded for any input size
+    '''
+    lat_values = df[lat].to_numpy(dtype=np.float64)
+    # Scale longitude by cos(latitude) so the cells are regular hexagons on the ground
+    x_scale = np.cos(np.radians(np.nanmean(lat_values))) if len(df) else 1.0
+    x = df[lon].to_numpy(dtype=np.float64) * x_scale
+    y = lat_values
+    values = df[value].to_numpy(dtype=np.float64)
+
+    while True:
+        # Axial coordinates of pointy-top hexagons, rounded in cube coordinates
+        q = (SQRT3 / 3 * x - y / 3) / size
+        r = (2 / 3 * y) / size
+        s = -q - r
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+
+        cells = pd.DataFrame({'q': rq.astype(np.int64), 'r': rr.astype(np.int64), value: values})
+        bins = cells.groupby(['q', 'r'])[value].agg(['size', 'mean']).reset_index()
+        if len(bins) <= max_bins:
+            break
+        size *= 2
+
+    return pd.DataFrame({
+        lat: size * 1.5 * bins['r'],
+        lon: size * SQRT3 * (bins['q'] + bins['r'] / 2) / x_scale,
+        'count': bins['size'],
+        value: bins['mean'],
+    })
+
+
+def density_bins(df, x, y, bins=100):
+    '''
+    Count points on a bins x bins grid. Returns the counts as a (y, x) matrix, ready to be drawn
+    as a heatmap, and the x and y cell centres
+    '''
+    counts, x_edges, y_edges = np.histogram2d(df[x].to_numpy(dtype=np.float64), df[y].to_numpy(dtype=np.float64), bins=bins)
+    return counts.T.astype(np.int64), (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2
+
+
+def stratified_sample(df, column, n=5000, strata=20, min_per_stratum=25, random_state=0):
+    '''
+    Sample about n rows, allocated proportionally across quantile strata of column but with at
+    least min_per_stratum rows from each, so sparse tails are still represented
+    '''
+    if len(df) <= n:
+        return df
+    edges = np.unique(np.quantile(df[column], np.linspace(0, 1, strata + 1)[1:-1]))
+    stratum = np.searchsorted(edges, df[column].to_numpy(), side='right')
+    sizes = np.bincount(stratum, minlength=len(edges) + 1)
+    quota = np.maximum(np.round(sizes * n / len(df)), min_per_stratum)
+
+    # Rank rows within their stratum in a random order and keep the first quota of each
+    order = np.random.default_rng(random_state).permutation(len(df))
+    shuffled = pd.Series(stratum[order])
+    rank = shuffled.groupby(shuffled).cumcount().to_numpy()
+    keep = np.sort(order[rank < quota[stratum[order]]])
+    return df.iloc[keep]
@@ -0,0 +1,268 @@
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from src import artifacts, storage
+from src.predict import FEATURE_COLUMNS
+
+PREDICTION_COLUMN = 'predicted_price'
+MONITORED_COLUMNS = FEATURE_COLUMNS + [PREDICTION_COLUMN]
+# Columns with at most this many distinct training values get one bin per value, others get deciles
+MAX_DISCRETE_VALUES = 20
+QUANTILES = np.linspace(0.1, 0.9, 9)
+# Population stability index thresholds commonly used for a moderate and a significant shift
+PSI_WARNING = 0.1
+PSI_DRIFT = 0.25
+_EPSILON = 1e-4
+
+
+def _bin_edges(values):
+    distinct = np.unique(values)
+    if len(distinct) <= MAX_DISCRETE_VALUES:
+        return (distinct[:-1] + distinct[1:]) / 2
+    return np.unique(np.quantile(values, QUANTILES))
+
+
+def compute_reference(df):
+    '''
+    Reference statistics of every monitored column of the training data (processed_data rows with
+    price): histogram bin edges and proportions, bounds, mean and standard deviation. Predictions
+    are compared against the training prices
+    '''
+    reference = {}
+    for column in MONITORED_COLUMNS:
+        values = df['price' if column == PREDICTION_COLUMN else column].to_numpy(dtype=np.float64)
+        edges = _bin_edges(values)
+        counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+        reference[column] = {
+            'edges': edges,
+            'proportions': counts / counts.sum(),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'mean': float(values.mean()),
+            'std': float(values.std()),
+        }
+    return reference
+
+
+def load_reference(file_path=artifacts.PROCESSED_DATA_PATH):
+    return compute_reference(storage.read_dataset(file_path))
+
+
+def psi(expected, actual):
+    '''
+    Population stability index between two histograms given as proportions
+    '''
+    expected = np.maximum(expected, _EPSILON)
+    actual = np.maximum(actual, _EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    '''
+    Streaming per-column sketches of prediction inputs and outputs, compared against the training
+    reference. Each column keeps a fixed number of histogram bins (exponentially decayed so the
+    drift score follows recent traffic) and running count, mean, variance and bounds, so memory
+    does not grow with the number of rows observed
+    '''
+
+    def __init__(self, reference, half_life=10_000, min_count=100):
+        self.reference = reference
+        self.columns = list(reference)
+        self.min_count = min_count
+        self._decay = 0.5 ** (1 / half_life)
+        # Bin edges of all columns as one matrix padded with +inf, so a batch is binned in one comparison
+        widest = max(len(reference[column]['edges']) for column in self.columns)
+        self._edges = np.full((len(self.columns), widest), np.inf)
+        for i, column in enumerate(self.columns):
+            self._edges[i, :len(reference[column]['edges'])] = reference[column]['edges']
+        self._bins = widest + 1
+        self._low = np.array([reference[column]['min'] for column in self.columns])
+        self._high = np.array([reference[column]['max'] for column in self.columns])
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = np.zeros(len(self.columns) * self._bins)
+            self.rows = 0
+            self._n = np.zeros(len(self.columns))
+            self._mean = np.zeros(len(self.columns))
+            self._m2 = np.zeros(len(self.columns))
+            self._min = np.full(len(self.columns), np.inf)
+            self._max = np.full(len(self.columns), -np.inf)
+            self._out_of_range = np.zeros(len(self.columns), dtype=np.int64)
+
+    def out_of_range(self, values):
+        '''
+        Boolean (rows, columns) mask of values outside the range seen in training, or not finite
+        '''
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        width = values.shape[1]
+        return (values < self._low[:width]) | (values > self._high[:width]) | ~np.isfinite(values)
+
+    def observe(self, rows, predictions=None):
+        '''
+        Add rows of the 20 features in training order (and their predictions) to the sketches.
+        Returns, for each row, the names of the columns that were out of the training range.
+        Non-finite values are flagged but kept out of the histograms and running statistics
+        '''
+        values = np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+        if predictions is not None:
+            values = np.column_stack([values, np.asarray(predictions, dtype=np.float64).reshape(-1)])
+        n, width = values.shape
+        if n == 0:
+            return []
+        flags = self.out_of_range(values)
+        finite = np.isfinite(values)
+        # Same bins as np.searchsorted(edges, value, side='right') per column
+        bins = (values[:, :, None] >= self._edges[:width]).sum(axis=2) + np.arange(width) * self._bins
+        # Per-column count, mean and squared deviations of the finite values in this batch
+        count = finite.sum(axis=0)
+        batch_mean = np.where(finite, values, 0.0).sum(axis=0) / np.maximum(count, 1)
+        batch_m2 = np.where(finite, values - batch_mean, 0.0) ** 2
+
+        with self._lock:
+            self._counts *= self._decay ** n
+            self._counts += np.bincount(bins[finite], minlength=len(self._counts))
+            # Chan et al. parallel update of the running mean and variance with this batch
+            seen = self._n[:width]
+            total = seen + count
+            delta = batch_mean - self._mean[:width]
+            share = np.divide(count, total, out=np.zeros(width), where=total > 0)
+            self._m2[:width] += batch_m2.sum(axis=0) + delta ** 2 * seen * share
+            self._mean[:width] += delta * share
+            self._n[:width] = total
+            self._min[:width] = np.minimum(self._min[:width], np.where(finite, values, np.inf).min(axis=0))
+            self._max[:width] = np.maximum(self._max[:width], np.where(finite, values, -np.inf).max(axis=0))
+            self._out_of_range[:width] += flags.sum(axis=0)
+            self.rows += n
+
+        return [[self.columns[i] for i in np.flatnonzero(row)] for row in flags] if flags.any() else [[] for _ in range(n)]
+
+    def report(self):
+        '''
+        Per-column drift score (PSI of the recent histogram against the training one), status,
+        out-of-range count and running statistics
+        '''
+        with self._lock:
+            report = {}
+            for i, column in enumerate(self.columns):
+                reference = self.reference[column]
+                counts = self._counts[i * self._bins:i * self._bins + len(reference['proportions'])]
+                weight = counts.sum()
+                score = psi(reference['proportions'], counts / weight) if weight else 0.0
+                if weight < self.min_count:
+                    status = 'insufficient data'
+                elif score >= PSI_DRIFT:
+                    status = 'drift'
+                elif score >= PSI_WARNING:
+                    status = 'warning'
+                else:
+                    status = 'ok'
+                seen = self._n[i] > 0
+                report[column] = {
+                    'status': status,
+                    'psi': score,
+                    'out_of_range': int(self._out_of_range[i]),
+                    'mean': float(self._mean[i]) if seen else None,
+                    'std': float(np.sqrt(self._m2[i] / self._n[i])) if seen else None,
+                    'min': float(self._min[i]) if seen else None,
+                    'max': float(self._max[i]) if seen else None,
+                    'reference_mean': reference['mean'],
+                    'reference_min': reference['min'],
+                    'reference_max': reference['max'],
+                }
+            return report
+
+    def summary(self):
+        '''
+        Rows observed and the columns currently flagged, for health checks and sidebars
+        '''
+        report = self.report()
+        return {
+            'rows': self.rows,
+            'drift': [column for column, stats in report.items() if stats['status'] == 'drift'],
+            'warning': [column for column, stats in report.items() if stats['status'] == 'warning'],
+            'out_of_range': {column: stats['out_of_range'] for column, stats in report.items() if stats['out_of_range']},
+        }
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor():
+    '''
+    Process-wide monitor of the inputs and predictions served, against processed_data.csv
+    '''
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = DriftMonitor(artifacts.load_artifact(artifacts.PROCESSED_DATA_PATH, load_reference))
+        return _monitor
+
+
+def benchmark(rows=10_000):
+    '''
+    Microseconds per observed row, one row at a time (the Prediction page and service) and in batches
+    '''
+    from src.predict import predict_frame
+
+    df = storage.read_dataset(artifacts.PROCESSED_DATA_PATH)
+    monitor = DriftMonitor(compute_reference(df))
+    sample = df.sample(rows, replace=len(df) < rows, random_state=0)
+    features = sample[FEATURE_COLUMNS].to_numpy()
+    prices = predict_frame(artifacts.load_model(artifacts.MODEL_PATH), artifacts.load_scaler(artifacts.SCALER_PATH), sample)
+    single = min(rows, 2000)
+    start = time.perf_counter()
+    for i in range(single):
+        monitor.observe(features[i:i + 1], prices[i:i + 1])
+    per_row = (time.perf_counter() - start) / single
+    start = time.perf_counter()
+    for i in range(0, rows, 256):
+        monitor.observe(features[i:i + 256], prices[i:i + 256])
+    batched = (time.perf_counter() - start) / rows
+    return {'single_row_us': per_row * 1e6, 'batched_row_us': batched * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare model inputs and predictions against the training data')
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help='stream a CSV or Parquet file through the monitor and report drift')
+    check.add_argument('input')
+    check.add_argument('--raw', action='store_true', help='input holds raw kc_house_data rows instead of model features')
+    check.add_argument('--chunk-size', type=int, default=10_000)
+    bench = commands.add_parser('benchmark', help='time observing rows one at a time and in batches')
+    bench.add_argument('--rows', type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'benchmark':
+        results = benchmark(args.rows)
+        print(f"single row: {results['single_row_us']:.1f} us/row")
+        print(f"batches:    {results['batched_row_us']:.2f} us/row")
+        return
+
+    from src.batch import read_chunks
+    from src.predict import predict_frame
+
+    model = artifacts.load_model(artifacts.MODEL_PATH)
+    scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    # Half-life longer than any file, so the report covers every row
+    monitor = DriftMonitor(artifacts.load_artifact(artifacts.PROCESSED_DATA_PATH, load_reference), half_life=1e12)
+    for chunk in read_chunks(args.input, args.chunk_size, raw=args.raw):
+        monitor.observe(chunk[FEATURE_COLUMNS].to_numpy(), predict_frame(model, scaler, chunk))
+        print(f"{monitor.rows} rows checked", file=sys.stderr)
+    print(f"{'column':16s} {'status':18s} {'psi':>7s} {'out of range':>12s} {'mean':>12s} {'training mean':>14s}")
+    for column, stats in monitor.report().items():
+        # A column with no finite values in the input has no mean
+        mean = 'n/a' if stats['mean'] is None else f"{stats['mean']:.2f}"
+        print(f"{column:16s} {stats['status']:18s} {stats['psi']:7.3f} {stats['out_of_range']:12d} "
+              f"{mean:>12s} {stats['reference_mean']:14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+import xgboost as xgb
+
+from src import artifacts
+from src.predict import FEATURE_COLUMNS
+
+BASE_VALUE = 'base_value'
+
+
+def explain_rows(model, scaler, features, approximate=False):
+    '''
+    Per-feature contributions to each prediction, as an array of shape (rows, 21): one column per
+    model feature plus the base value last. Each row sums to the prediction.
+
+    Uses xgboost's built-in TreeSHAP, which walks the tree paths in C++ for the whole batch at
+    once. approximate=True uses the much faster Saabas attribution instead of exact SHAP values
+    '''
+    X = scaler.transform(features[FEATURE_COLUMNS])
+    return model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True, approx_contribs=approximate)
+
+
+def explain_frame(model, scaler, df, approximate=False):
+    '''
+    Contributions of every row of df as a DataFrame with a column per feature and the base value
+    '''
+    contributions = explain_rows(model, scaler, df, approximate)
+    return pd.DataFrame(contributions, columns=FEATURE_COLUMNS + [BASE_VALUE], index=df.index)
+
+
+def waterfall_steps(contributions, top=8):
+    '''
+    Order one row of contributions for a waterfall chart: the top features by absolute
+    contribution, then the remaining features combined into one step
+    '''
+    contributions = pd.Series(contributions[:len(FEATURE_COLUMNS)], index=FEATURE_COLUMNS)
+    order = contributions.abs().sort_values(ascending=False).index
+    steps = [(feature, float(contributions[feature])) for feature in order[:top]]
+    if len(order) > top:
+        steps.append((f'{len(order) - top} other features', float(contributions[order[top:]].sum())))
+    return steps
+
+
+def benchmark(rows=10_000, repeats=3):
+    '''
+    Rows per second for exact and approximate explanations of processed_data rows
+    '''
+    model = artifacts.load_model(artifacts.MODEL_PATH)
+    scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    df = artifacts.load_processed_data(artifacts.PROCESSED_DATA_PATH)
+    df = df.sample(rows, replace=len(df) < rows, random_state=0)
+    results = {}
+    for name, approximate in (('exact', False), ('approximate', True)):
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            explain_rows(model, scaler, df, approximate)
+            best = min(best, time.perf_counter() - start)
+        results[name] = rows / best
+    start = time.perf_counter()
+    explain_rows(model, scaler, df.iloc[:1])
+    results['single_row_ms'] = (time.perf_counter() - start) * 1000
+    return results
+
+
+def main(argv=None):
+    # Only the command line needs the file readers, so the Prediction page does not import them
+    from src.batch import ChunkWriter, read_chunks
+
+    parser = argparse.ArgumentParser(description='Per-feature explanations of model predictions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='write contributions for every row of a CSV or Parquet file')
+    run.add_argument('input')
+    run.add_argument('output')
+    run.add_argument('--chunk-size', type=int, default=10_000)
+    run.add_argument('--raw', action='store_true', help='input holds raw kc_house_data rows instead of model features')
+    run.add_argument('--approximate', action='store_true', help='Saabas attributions instead of exact SHAP values')
+    bench = commands.add_parser('benchmark', help='time exact and approximate explanations')
+    bench.add_argument('--rows', type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'benchmark':
+        results = benchmark(args.rows)
+        print(f"exact:       {results['exact']:,.0f} rows/sec")
+        print(f"approximate: {results['approximate']:,.0f} rows/sec")
+        print(f"single row:  {results['single_row_ms']:.2f} ms")
+        return
+
+    model = artifacts.load_model(artifacts.MODEL_PATH)
+    scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    rows = 0
+    start = time.perf_counter()
+    with ChunkWriter(args.output) as writer:
+        for chunk in read_chunks(args.input, args.chunk_size, raw=args.raw):
+            explained = explain_frame(model, scaler, chunk, args.approximate).add_prefix('shap_')
+            if 'id' in chunk:
+                explained.insert(0, 'id', chunk['id'])
+            writer.write(explained)
+            rows += len(chunk)
+            print(f"{rows} rows explained, {rows / (time.perf_counter() - start):,.0f} rows/sec", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.predict import FEATURE_COLUMNS
+
+# Raw columns copied straight into the model features
+PASSTHROUGH_COLUMNS = [column for column in FEATURE_COLUMNS if column not in ('year', 'month', 'house_age')]
+
+
+def house_age(year_sold, yr_built):
+    '''
+    Age of the house in the year it was sold
+    '''
+    return year_sold - yr_built
+
+
+def sale_year_month(dates):
+    '''
+    Year and month of sale for a Series of raw dates, either datetimes or strings like
+    20141013T000000. Strings are sliced in bulk instead of being parsed row by row; a string
+    that does not start with a valid YYYYMM raises ValueError
+    '''
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.year.to_numpy(), dates.dt.month.to_numpy()
+    # Fixed-width bytes: YYYYMM are the first six characters
+    digits = np.asarray(dates, dtype='S6').view(np.uint8).reshape(-1, 6).astype(np.int64) - ord('0')
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    invalid = ((digits < 0) | (digits > 9)).any(axis=1) | (month < 1) | (month > 12)
+    if invalid.any():
+        bad = np.asarray(dates, dtype=object)[invalid]
+        raise ValueError(f"{len(bad)} dates are not in the YYYYMMDDTHHMMSS format, e.g. {bad[0]!r}")
+    return year, month
+
+
+def build_features(raw, target=False):
+    '''
+    Turn raw kc_house_data rows into the model features, in the column order the scaler expects.
+    Reproduces the notebook preprocessing: drop id/zipcode, split date into year/month and
+    derive house_age. With target=True the price column is kept in front, as in processed_data.csv
+    '''
+    year, month = sale_year_month(raw['date'])
+    features = raw[PASSTHROUGH_COLUMNS].copy()
+    features['year'] = year
+    features['month'] = month
+    features['house_age'] = house_age(year, raw['yr_built'].to_numpy())
+    features = features[FEATURE_COLUMNS]
+    if target:
+        features.insert(0, 'price', raw['price'].to_numpy())
+    return features.reset_index(drop=True)
+
+
+def features_from_record(record):
+    '''
+    Model features for a single raw sale given as a dict
+    '''
+    return build_features(pd.DataFrame([record]))
+
+
+def iter_features(csv_path, chunk_size=100_000, target=False):
+    '''
+    Stream a raw sales CSV as feature DataFrames of at most chunk_size rows
+    '''
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, dtype={'date': str}):
+        yield build_features(chunk, target=target)
+
+
+def benchmark(raw, rows=(1, 1_000_000), repeat=200):
+    '''
+    Time feature building for a single record and for large frames replicated from raw
+    '''
+    record = raw.iloc[0].to_dict()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        features_from_record(record)
+    results = {'single_record_ms': (time.perf_counter() - start) / repeat * 1000}
+    for n in rows:
+        if n <= 1:
+            continue
+        big = raw.iloc[np.arange(n) % len(raw)]
+        start = time.perf_counter()
+        build_features(big)
+        seconds = time.perf_counter() - start
+        results[f'{n}_rows_per_sec'] = n / seconds
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build model features from raw King County sales')
+    parser.add_argument('command', choices=['build', 'benchmark'])
+    parser.add_argument('--input', default='notebooks/data/kc_house_data.csv')
+    parser.add_argument('--output', default='notebooks/data/processed_data.csv')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        for i, chunk in enumerate(iter_features(args.input, args.chunk_size, target=True)):
+            chunk.to_csv(args.output, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        print(f"Wrote {args.output}")
+    else:
+        raw = pd.read_csv(args.input, dtype={'date': str})
+        print(json.dumps(benchmark(raw), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from src import metrics, storage
+from src.batch import read_chunks
+from src.features import build_features
+from src.predict import FEATURE_COLUMNS
+
+SALES_DIR = 'notebooks/data/sales'
+CONFIG_FILE = '_dataset.json'
+# Raw columns that are not model features, kept so the raw sales can be rebuilt and deduplicated
+KEY_COLUMNS = ['id', 'date']
+# Dedupe keys pack the house id above the sale day (days since 1900, 17 bits, so until 2258)
+DAY_BITS = 17
+MAX_ID = 2 ** (63 - DAY_BITS) - 1
+_FIRST_DAY = np.datetime64('1900-01-01', 'D')
+
+
+def _config_path(root):
+    return os.path.join(root, CONFIG_FILE)
+
+
+def load_config(root):
+    with open(_config_path(root)) as f:
+        return json.load(f)
+
+
+def partition_columns(root, by_zipcode=False):
+    '''
+    Partition columns of the dataset at root, fixed when its first file is ingested
+    '''
+    if os.path.exists(_config_path(root)):
+        partition_by = load_config(root)['partition_by']
+        if by_zipcode and 'zipcode' not in partition_by:
+            raise ValueError(f"{root} is partitioned by {', '.join(partition_by)}, not by zipcode")
+        return partition_by
+    partition_by = ['year', 'month'] + (['zipcode'] if by_zipcode else [])
+    os.makedirs(root, exist_ok=True)
+    with open(_config_path(root), 'w') as f:
+        json.dump({'partition_by': partition_by}, f)
+    return partition_by
+
+
+def sale_keys(ids, dates):
+    '''
+    One int64 per sale identifying the (house id, sale day) pair, for deduplication
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    days = (pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]') - _FIRST_DAY).astype(np.int64)
+    if len(ids) and (ids.min() < 0 or ids.max() > MAX_ID):
+        raise ValueError(f"House ids must be between 0 and {MAX_ID:,}")
+    if len(days) and (days.min() < 0 or days.max() >= 2 ** DAY_BITS):
+        raise ValueError("Sale dates must be between 1900 and 2258")
+    return (ids << DAY_BITS) | days
+
+
+def prepare(raw):
+    '''
+    Typed rows to store for a chunk of raw sales: the processed_data features and price (as built
+    for training, model inputs at full precision) plus the id, date and zipcode of each sale
+    '''
+    features = build_features(raw, target=True)
+    features.insert(0, 'zipcode', raw['zipcode'].to_numpy())
+    features.insert(0, 'date', raw['date'].to_numpy())
+    features.insert(0, 'id', raw['id'].to_numpy())
+    return storage.to_typed(features)
+
+
+def _partition_dir(root, partition_by, values):
+    return os.path.join(root, *[f'{column}={value}' for column, value in zip(partition_by, values)])
+
+
+class Ingestor:
+    '''
+    Append raw sales to a dataset partitioned by year/month (and optionally zipcode), skipping
+    sales whose id and date are already stored. The keys of each year/month partition are read
+    once per ingest run, from that partition only
+    '''
+
+    def __init__(self, root=SALES_DIR, by_zipcode=False):
+        self.root = root
+        self.partition_by = partition_columns(root, by_zipcode)
+        self._keys = {}
+        self.rows_read = 0
+        self.rows_written = 0
+        self.duplicates = 0
+        self.files_written = 0
+
+    def _existing_keys(self, year, month):
+        key = (year, month)
+        if key not in self._keys:
+            import pyarrow.parquet as pq
+
+            month_dir = _partition_dir(self.root, ['year', 'month'], key)
+            keys = np.empty(0, dtype=np.int64)
+            if os.path.isdir(month_dir):
+                files = [os.path.join(directory, name) for directory, _, names in os.walk(month_dir)
+                         for name in names if name.endswith('.parquet')]
+                if files:
+                    table = pq.read_table(files, columns=KEY_COLUMNS, partitioning=None).to_pandas()
+                    keys = sale_keys(table['id'], table['date'])
+            self._keys[key] = keys
+        return self._keys[key]
+
+    def ingest_frame(self, raw):
+        '''
+        Transform, deduplicate and write one DataFrame of raw sales. Returns the rows written
+        '''
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with metrics.timed('ingest_chunk'):
+            rows = prepare(raw)
+            self.rows_read += len(rows)
+            keys = sale_keys(rows['id'], rows['date'])
+            # Repeats within the chunk itself: the first occurrence is kept
+            first = np.zeros(len(rows), dtype=bool)
+            first[np.unique(keys, return_index=True)[1]] = True
+            written = 0
+            for (year, month), index in rows.groupby(['year', 'month']).indices.items():
+                existing = self._existing_keys(year, month)
+                index = index[first[index] & ~np.isin(keys[index], existing)]
+                self._keys[(year, month)] = np.concatenate([existing, keys[index]])
+                partition = rows.iloc[index].drop(columns=['year', 'month'])
+                groups = partition.groupby('zipcode').indices.items() if 'zipcode' in self.partition_by else [(None, None)]
+                for zipcode, zip_index in groups:
+                    part = partition if zipcode is None else partition.iloc[zip_index].drop(columns=['zipcode'])
+                    if part.empty:
+                        continue
+                    directory = _partition_dir(self.root, self.partition_by, (year, month, zipcode))
+                    os.makedirs(directory, exist_ok=True)
+                    table = pa.Table.from_pandas(part, preserve_index=False)
+                    # Written under a hidden temporary name and renamed, so readers never see a partial file
+                    name = f'part-{uuid.uuid4().hex}.parquet'
+                    tmp_path = os.path.join(directory, f'.{name}.tmp')
+                    pq.write_table(table, tmp_path)
+                    os.replace(tmp_path, os.path.join(directory, name))
+                    self.files_written += 1
+                written += len(index)
+            self.duplicates += len(rows) - written
+            self.rows_written += written
+        return written
+
+    def ingest_file(self, file_path, chunk_size=1_000_000, verbose=False):
+        '''
+        Ingest a raw sales CSV or Parquet file chunk by chunk
+        '''
+        for chunk in read_chunks(file_path, chunk_size):
+            self.ingest_frame(chunk)
+            if verbose:
+                print(f"{self.rows_read} rows read, {self.rows_written} written, {self.duplicates} duplicates",
+                      file=sys.stderr)
+
+    def stats(self):
+        return {'rows_read': self.rows_read, 'rows_written': self.rows_written,
+                'duplicates': self.duplicates, 'files_written': self.files_written}
+
+
+def _filter(years=None, months=None, zipcodes=None):
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, values in (('year', years), ('month', months), ('zipcode', zipcodes)):
+        if values is not None:
+            condition = ds.field(column).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_dataset(root=SALES_DIR):
+    import pyarrow.dataset as ds
+
+    return ds.dataset(root, format='parquet', partitioning='hive', exclude_invalid_files=False,
+                      ignore_prefixes=['.', '_'])
+
+
+def scan(root=SALES_DIR, columns=None, years=None, months=None, zipcodes=None):
+    '''
+    Read the stored sales as one DataFrame. Filters on year and month (and zipcode when the
+    dataset is partitioned by it) skip whole partitions without opening their files
+    '''
+    with metrics.timed('ingest_scan'):
+        table = open_dataset(root).to_table(columns=columns, filter=_filter(years, months, zipcodes))
+        return table.to_pandas()
+
+
+def iter_scan(root=SALES_DIR, columns=None, years=None, months=None, zipcodes=None, batch_rows=1_000_000):
+    '''
+    Stream the stored sales as DataFrames of at most batch_rows rows, for data larger than memory
+    '''
+    batches = open_dataset(root).to_batches(columns=columns, filter=_filter(years, months, zipcodes),
+                                            batch_size=batch_rows)
+    for batch in batches:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_features(root=SALES_DIR, years=None, months=None, zipcodes=None):
+    '''
+    Stored sales in processed_data.csv layout: price followed by the 20 model features in training order
+    '''
+    df = scan(root, ['price'] + FEATURE_COLUMNS, years, months, zipcodes)
+    return df.astype({'year': storage.COLUMN_DTYPES['year'], 'month': storage.COLUMN_DTYPES['month']})
+
+
+def synthetic_chunks(raw, rows, chunk_size, random_state=0):
+    '''
+    Raw sales replicated from raw up to rows, in chunks, with unique ids and noise on price and location
+    '''
+    rng = np.random.default_rng(random_state)
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        chunk = raw.iloc[np.arange(start, start + size) % len(raw)].reset_index(drop=True)
+        chunk['id'] = np.arange(start, start + size) + 10_000_000_000
+        chunk['price'] = (chunk['price'] * rng.normal(1, 0.05, size)).round()
+        chunk['lat'] = chunk['lat'] + rng.normal(0, 0.001, size)
+        chunk['long'] = chunk['long'] + rng.normal(0, 0.001, size)
+        yield chunk
+
+
+def benchmark(rows=10_000_000, chunk_size=1_000_000, by_zipcode=False, root=None):
+    '''
+    Ingest throughput for rows synthetic sales, the cost of re-ingesting a chunk of duplicates,
+    and scan times for the whole dataset and for pruned partitions
+    '''
+    raw = pd.read_csv('notebooks/data/kc_house_data.csv', dtype={'date': str})
+    with tempfile.TemporaryDirectory() as tmp:
+        root = root or os.path.join(tmp, 'sales')
+        ingestor = Ingestor(root, by_zipcode)
+        start = time.perf_counter()
+        for chunk in synthetic_chunks(raw, rows, chunk_size):
+            ingestor.ingest_frame(chunk)
+            print(f"{ingestor.rows_written:,} rows ingested", file=sys.stderr)
+        ingest_seconds = time.perf_counter() - start
+
+        duplicate = next(synthetic_chunks(raw, min(rows, chunk_size), chunk_size))
+        start = time.perf_counter()
+        Ingestor(root, by_zipcode).ingest_frame(duplicate)
+        duplicate_seconds = time.perf_counter() - start
+
+        results = {
+            'rows': ingestor.rows_written,
+            'files': ingestor.files_written,
+            'ingest_rows_per_sec': ingestor.rows_written / ingest_seconds,
+            'reingest_duplicates_rows_per_sec': len(duplicate) / duplicate_seconds,
+        }
+        scans = {
+            'scan_all_features': lambda: read_features(root),
+            'scan_price_sqft_living': lambda: scan(root, ['price', 'sqft_living']),
+            'scan_one_month': lambda: read_features(root, years=[2014], months=[5]),
+            'scan_one_zipcode': lambda: read_features(root, zipcodes=[98103]),
+            'scan_one_month_one_zipcode': lambda: read_features(root, years=[2014], months=[5], zipcodes=[98103]),
+        }
+        for name, run in scans.items():
+            start = time.perf_counter()
+            result_rows = len(run())
+            results[f'{name}_seconds'] = time.perf_counter() - start
+            results[f'{name}_rows'] = result_rows
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Append raw sales to the partitioned sales dataset')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='ingest raw kc_house_data-format CSV or Parquet files')
+    ingest.add_argument('files', nargs='+')
+    ingest.add_argument('--root', default=SALES_DIR)
+    ingest.add_argument('--by-zipcode', action='store_true', help='also partition by zipcode (only when creating the dataset)')
+    ingest.add_argument('--chunk-size', type=int, default=1_000_000)
+    bench = commands.add_parser('benchmark', help='time ingesting and scanning synthetic sales')
+    bench.add_argument('--rows', type=int, default=10_000_000)
+    bench.add_argument('--chunk-size', type=int, default=1_000_000)
+    bench.add_argument('--by-zipcode', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.command == 'benchmark':
+        for name, value in benchmark(args.rows, args.chunk_size, args.by_zipcode).items():
+            print(f"{name:45s} {value:,.3f}" if isinstance(value, float) else f"{name:45s} {value:,}")
+        return
+
+    ingestor = Ingestor(args.root, args.by_zipcode)
+    start = time.perf_counter()
+    for file_path in args.files:
+        ingestor.ingest_file(file_path, args.chunk_size, verbose=True)
+    stats = ingestor.stats()
+    print(f"Ingested {stats['rows_written']:,} of {stats['rows_read']:,} rows ({stats['duplicates']:,} duplicates) "
+          f"into {stats['files_written']} files in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
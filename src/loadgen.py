@@ -0,0 +1,75 @@
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from src import artifacts
+from src.predict import FEATURE_COLUMNS
+
+
+def run_load(url, records, concurrency=16, requests=2000):
+    '''
+    Send single-house prediction requests from concurrent threads and measure client-side latency
+    '''
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            body = json.dumps(records[i % len(records)]).encode()
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except Exception:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99) * 1000) if len(latencies) else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load generator for the prediction service')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/predict')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--data', default=artifacts.PROCESSED_DATA_PATH, help='CSV to draw request payloads from')
+    args = parser.parse_args(argv)
+
+    records = pd.read_csv(args.data, nrows=1000)[FEATURE_COLUMNS].to_dict(orient='records')
+    result = run_load(args.url, records, args.concurrency, args.requests)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
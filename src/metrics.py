@@ -0,0 +1,175 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentation is off unless HOUSE_PRICE_METRICS=1; disabled stages cost one flag check
+_enabled = os.environ.get('HOUSE_PRICE_METRICS', '') not in ('', '0', 'false')
+_stages = {}
+_lock = threading.Lock()
+_exporters_started = False
+_disabled = nullcontext()
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def rss_bytes():
+    '''
+    Resident set size of this process (Linux), or None where /proc is unavailable
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class _Timer:
+    __slots__ = ('stage', 'start', 'rss')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.rss = rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start, self.rss)
+        return False
+
+
+def timed(stage):
+    '''
+    Context manager recording the latency and memory delta of a block under stage
+    '''
+    return _Timer(stage) if _enabled else _disabled
+
+
+def record(stage, seconds, rss_before=None):
+    # Callers timing a stage themselves record it unconditionally; like timed(), nothing is kept when disabled
+    if not _enabled:
+        return
+    rss_after = rss_bytes() if rss_before is not None else None
+    milliseconds = seconds * 1000
+    with _lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            stats = _stages[stage] = {'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * len(BUCKETS_MS),
+                                      'memory_delta_bytes': 0, 'max_memory_delta_bytes': 0}
+        stats['count'] += 1
+        stats['sum_ms'] += milliseconds
+        stats['max_ms'] = max(stats['max_ms'], milliseconds)
+        for i, bound in enumerate(BUCKETS_MS):
+            if milliseconds <= bound:
+                stats['buckets'][i] += 1
+                break
+        if rss_after is not None:
+            delta = rss_after - rss_before
+            stats['memory_delta_bytes'] += delta
+            stats['max_memory_delta_bytes'] = max(stats['max_memory_delta_bytes'], delta)
+
+
+def snapshot():
+    '''
+    Copy of the per-stage counters, with mean latency added
+    '''
+    with _lock:
+        stages = {stage: dict(stats, buckets=list(stats['buckets'])) for stage, stats in _stages.items()}
+    for stats in stages.values():
+        stats['mean_ms'] = stats['sum_ms'] / stats['count']
+    return stages
+
+
+def render_prometheus():
+    '''
+    The counters in the Prometheus text exposition format
+    '''
+    lines = ['# TYPE house_price_stage_latency_ms histogram']
+    for stage, stats in sorted(snapshot().items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS, stats['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'house_price_stage_latency_ms_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'house_price_stage_latency_ms_sum{{stage="{stage}"}} {stats["sum_ms"]}')
+        lines.append(f'house_price_stage_latency_ms_count{{stage="{stage}"}} {stats["count"]}')
+    lines.append('# TYPE house_price_stage_memory_delta_bytes counter')
+    for stage, stats in sorted(snapshot().items()):
+        lines.append(f'house_price_stage_memory_delta_bytes{{stage="{stage}"}} {stats["memory_delta_bytes"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = render_prometheus().encode(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_log_dump(interval, stream=sys.stderr):
+    '''
+    Write a JSON snapshot of the counters to stream every interval seconds
+    '''
+    def dump():
+        while True:
+            time.sleep(interval)
+            print(json.dumps({'time': time.time(), 'stages': snapshot()}), file=stream, flush=True)
+
+    threading.Thread(target=dump, daemon=True).start()
+
+
+def start_exporters():
+    '''
+    Start the exporters configured by HOUSE_PRICE_METRICS_PORT and HOUSE_PRICE_METRICS_LOG_INTERVAL,
+    once per process however many times it is called (Streamlit reruns page scripts)
+    '''
+    global _exporters_started
+    with _lock:
+        if _exporters_started or not _enabled:
+            return
+        _exporters_started = True
+    port = os.environ.get('HOUSE_PRICE_METRICS_PORT')
+    if port:
+        start_http_server(int(port))
+    interval = os.environ.get('HOUSE_PRICE_METRICS_LOG_INTERVAL')
+    if interval:
+        start_log_dump(float(interval))
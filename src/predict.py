@@ -0,0 +1,34 @@
+from src import metrics
+
+# Order of the 20 features the scaler and model were fitted on (processed_data.csv without price)
+FEATURE_COLUMNS = [
+    'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors', 'waterfront', 'view',
+    'condition', 'grade', 'sqft_above', 'sqft_basement', 'yr_built', 'yr_renovated',
+    'lat', 'long', 'sqft_living15', 'sqft_lot15', 'year', 'month', 'house_age',
+]
+
+
+def scale_frame(scaler, df):
+    '''
+    Model inputs for every row of a DataFrame holding the model features.
+    Pass scaler=None for a compiled model, which has the scaler folded in
+    '''
+    # Select the features in training order so extra or reordered columns are harmless
+    features = df[FEATURE_COLUMNS]
+    if scaler is not None:
+        with metrics.timed('scaler_transform'):
+            features = scaler.transform(features)
+    return features
+
+
+def predict_scaled(model, features):
+    with metrics.timed('model_predict'):
+        return model.predict(features)
+
+
+def predict_frame(model, scaler, df):
+    '''
+    Scale and predict every row of a DataFrame holding the model features.
+    Pass scaler=None for a compiled model, which has the scaler folded in
+    '''
+    return predict_scaled(model, scale_frame(scaler, df))
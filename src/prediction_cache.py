@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src import artifacts, registry
+from src.predict import FEATURE_COLUMNS
+
+
+def feature_row(input_data):
+    '''
+    Order the values of a feature dict the way the model expects them
+    '''
+    return [input_data[column] for column in FEATURE_COLUMNS]
+
+
+def row_key(row):
+    '''
+    Hash an ordered feature row so that equal houses share a key regardless of int/float
+    types (3 and 3.0) or the sign of zero
+    '''
+    values = np.asarray(row, dtype=np.float64) + 0.0
+    return hashlib.blake2b(values.tobytes(), digest_size=16).digest()
+
+
+class PredictionCache:
+    '''
+    Bounded LRU cache of predictions with a time-to-live, cleared automatically
+    whenever the model or scaler artifact is reloaded from a changed file.
+    With follow_active=True it caches for the registry's active model and is also
+    cleared when a different model is promoted
+    '''
+
+    def __init__(self, maxsize=10_000, ttl=3600.0, model_path=artifacts.MODEL_PATH, scaler_path=artifacts.SCALER_PATH,
+                 follow_active=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.follow_active = follow_active
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        if self.follow_active:
+            self.model_path, self.scaler_path = registry.active_paths()
+        return (self.model_path, artifacts.artifact_version(self.model_path),
+                artifacts.artifact_version(self.scaler_path) if self.scaler_path else None)
+
+    def _check_version(self):
+        version = self._current_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored = entry
+        if now - stored > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value, now):
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def predict(self, rows, predict):
+        '''
+        Return predictions for a list of ordered feature rows, calling predict(missing_rows)
+        once for all rows that are not cached. predict may return one value or one vector per row
+        '''
+        keys = [row_key(row) for row in rows]
+        results = [None] * len(rows)
+        missing = []
+        with self._lock:
+            self._check_version()
+            now = time.monotonic()
+            for i, key in enumerate(keys):
+                value = self._get(key, now)
+                if value is None:
+                    missing.append(i)
+                else:
+                    results[i] = value
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Scored outside the lock so other callers are not blocked by the model
+            predictions = predict([rows[i] for i in missing])
+            with self._lock:
+                now = time.monotonic()
+                for i, value in zip(missing, predictions):
+                    results[i] = np.array(value, dtype=np.float64) if np.ndim(value) else float(value)
+                    self._put(keys[i], results[i], now)
+        return np.array(results, dtype=np.float64)
+
+    def predict_one(self, input_data, predict):
+        return self.predict([feature_row(input_data)], predict)[0]
+
+    def stats(self):
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every session of the Streamlit server
+prediction_cache = PredictionCache(follow_active=True)
+# Per-feature contribution vectors for the same rows, see src/explain.py
+explanation_cache = PredictionCache(follow_active=True)
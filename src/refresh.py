@@ -0,0 +1,144 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from xgboost import XGBRegressor
+
+from src import artifacts, registry
+from src.compiled import COMPILED_MODEL_PATH, raw_thresholds
+from src.features import build_features
+from src.predict import FEATURE_COLUMNS
+
+
+def update_scaler(scaler, X_new):
+    '''
+    Return a copy of the scaler with its mean/variance updated by the new rows (running
+    statistics via partial_fit, no pass over the old data)
+    '''
+    scaler = copy.deepcopy(scaler)
+    scaler.partial_fit(X_new)
+    return scaler
+
+
+def rescale_booster(booster, old_scaler, new_scaler):
+    '''
+    Move every split threshold from the old scaled feature space to the new one, so the existing
+    trees make the same decisions on raw features after the scaler is updated
+    '''
+    model = json.loads(booster.save_raw(raw_format='json'))
+    old_mean, old_scale = np.asarray(old_scaler.mean_), np.asarray(old_scaler.scale_)
+    new_mean, new_scale = np.asarray(new_scaler.mean_), np.asarray(new_scaler.scale_)
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        split = np.asarray(tree['left_children']) != -1
+        feature = np.asarray(tree['split_indices'])[split]
+        threshold = np.asarray(tree['split_conditions'], dtype=np.float64)
+        # Smallest raw value that went right under the old scaler, mapped into the new scale.
+        # Splits usually sit exactly on a training value, so a plain affine map would send
+        # rows equal to the split value down the wrong branch after float32 rounding
+        raw = raw_thresholds(threshold[split].astype(np.float32), old_mean[feature], old_scale[feature])
+        threshold[split] = ((raw - new_mean[feature]) / new_scale[feature]).astype(np.float32)
+        tree['split_conditions'] = threshold.tolist()
+
+    rescaled = xgb.Booster()
+    rescaled.load_model(bytearray(json.dumps(model).encode()))
+    return rescaled
+
+
+def refresh_model(model, scaler, new_data, rounds=100):
+    '''
+    Continue boosting the existing model on only the new rows. The scaler statistics are updated
+    incrementally and the existing trees are re-expressed in the updated scale first
+    '''
+    X_new = new_data[FEATURE_COLUMNS].astype(np.float64)
+    y_new = new_data['price'].to_numpy(dtype=np.float64)
+
+    new_scaler = update_scaler(scaler, X_new)
+    booster = rescale_booster(model.get_booster(), scaler, new_scaler)
+    # Read the training parameters as attributes: get_params() fails on models pickled by older xgboost
+    refreshed = XGBRegressor(n_estimators=rounds, max_depth=model.max_depth, learning_rate=model.learning_rate)
+    refreshed.fit(new_scaler.transform(X_new), y_new, xgb_model=booster)
+    return refreshed, new_scaler
+
+
+def publish(model, scaler, name, metadata, training_data, registry_dir=registry.REGISTRY_DIR):
+    '''
+    Register a refreshed model/scaler pair as a new version of name and make it the active model.
+    The bundle is complete on disk before the registry's active pointer is rewritten in one
+    atomic replace, so serving processes switch from the old pair to the new one with no moment
+    where the new scaler meets the old trees. Returns the new version
+    '''
+    _, test = registry.holdout_split()
+    registered = registry.register(name, model, scaler, registry.evaluate(model, scaler, test), training_data,
+                                   registry_dir, extra={'refresh': metadata})
+    registry.set_active(name, registered['version'], registry_dir)
+    return registered['version']
+
+
+def full_retrain_seconds(model, scaler, old_data, new_data):
+    '''
+    Time a from-scratch refit of the scaler and all trees on the old and new rows together
+    '''
+    data = pd.concat([old_data, new_data], ignore_index=True)
+    start = time.perf_counter()
+    X = copy.deepcopy(scaler).fit_transform(data[FEATURE_COLUMNS].astype(np.float64))
+    XGBRegressor(n_estimators=model.get_booster().num_boosted_rounds(), max_depth=model.max_depth,
+                 learning_rate=model.learning_rate).fit(X, data['price'])
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh the model with newly appended sales without a full retrain')
+    parser.add_argument('new_data', help='CSV of new sales with price, in processed_data.csv or (with --raw) kc_house_data.csv format')
+    parser.add_argument('--raw', action='store_true', help='new_data holds raw kc_house_data rows')
+    parser.add_argument('--rounds', type=int, default=100, help='trees added on the new rows')
+    parser.add_argument('--registry-dir', default=registry.REGISTRY_DIR)
+    parser.add_argument('--compare', action='store_true', help='also time a full retrain to report the time saved')
+    args = parser.parse_args(argv)
+
+    new_data = pd.read_csv(args.new_data, dtype={'date': str})
+    if args.raw:
+        new_data = build_features(new_data, target=True)
+    # Refresh whichever model is being served; the original pickles are registered as "xgboost"
+    active = registry.active_model(args.registry_dir)
+    if active is None:
+        name, parent = 'xgboost', artifacts.MODEL_PATH
+        model = artifacts.load_model(artifacts.MODEL_PATH)
+        scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    else:
+        model, scaler, parent_metadata = registry.load_bundle(*active, registry_dir=args.registry_dir)
+        name, parent = parent_metadata['name'], f"{parent_metadata['name']}:{parent_metadata['version']}"
+    if not hasattr(model, 'get_booster'):
+        parser.error(f"The active model {parent} is not an XGBoost model and cannot be refreshed")
+
+    start = time.perf_counter()
+    refreshed, new_scaler = refresh_model(model, scaler, new_data, args.rounds)
+    seconds = time.perf_counter() - start
+    metadata = {
+        'parent': parent,
+        'rows_added': len(new_data),
+        'rounds_added': args.rounds,
+        'trees': refreshed.get_booster().num_boosted_rounds(),
+        'rows_seen_by_scaler': int(new_scaler.n_samples_seen_),
+        'refresh_seconds': seconds,
+    }
+    if args.compare:
+        old_data = artifacts.load_processed_data(artifacts.PROCESSED_DATA_PATH)
+        metadata['full_retrain_seconds'] = full_retrain_seconds(refreshed, scaler, old_data, new_data)
+
+    version = publish(refreshed, new_scaler, name, metadata, args.new_data, args.registry_dir)
+    print(f"Published and activated {name}:{version}: {metadata['trees']} trees after adding {args.rounds} on {len(new_data)} rows in {seconds:.2f}s")
+    if args.compare:
+        print(f"A full retrain took {metadata['full_retrain_seconds']:.2f}s ({metadata['full_retrain_seconds'] / seconds:.1f}x longer)")
+    if os.environ.get('HOUSE_PRICE_MODEL'):
+        print(f"HOUSE_PRICE_MODEL={os.environ['HOUSE_PRICE_MODEL']} overrides the active model in this environment")
+    if os.path.exists(COMPILED_MODEL_PATH):
+        print(f"{COMPILED_MODEL_PATH} still holds the previous model; re-export it with python -m src.compiled export")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src import artifacts
+from src.predict import FEATURE_COLUMNS, predict_frame
+
+REGISTRY_DIR = 'artifacts/registry'
+ACTIVE_FILE = 'active.json'
+MODEL_FILE = 'model.pkl'
+SCALER_FILE = 'scaler.pkl'
+METADATA_FILE = 'metadata.json'
+
+
+def candidate_models():
+    '''
+    The nine regressors compared in notebooks/Model.ipynb, with the notebook's settings
+    '''
+    from sklearn.ensemble import AdaBoostRegressor, RandomForestRegressor
+    from sklearn.linear_model import Lasso, LinearRegression, Ridge
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.svm import SVR
+    from sklearn.tree import DecisionTreeRegressor
+    from xgboost import XGBRegressor
+
+    return {
+        'linear_regression': LinearRegression,
+        'lasso': Lasso,
+        'ridge': Ridge,
+        'svr': SVR,
+        'decision_tree': DecisionTreeRegressor,
+        'random_forest': RandomForestRegressor,
+        'ada_boost': AdaBoostRegressor,
+        'k_neighbors': KNeighborsRegressor,
+        'xgboost': lambda: XGBRegressor(n_estimators=1000, max_depth=3, learning_rate=0.1),
+    }
+
+
+def file_hash(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scaler_hash(scaler):
+    '''
+    Identify a fitted StandardScaler by its parameters, so bundles sharing a scaler can share scaled batches
+    '''
+    if scaler is None:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (scaler.mean_, scaler.scale_):
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def holdout_split(file_path=artifacts.PROCESSED_DATA_PATH, test_size=0.2, random_state=42):
+    '''
+    Training and test rows of processed_data.csv, split exactly as the notebook and src.train do
+    '''
+    from sklearn.model_selection import train_test_split
+
+    df = artifacts.load_processed_data(file_path)
+    return train_test_split(df, test_size=test_size, random_state=random_state)
+
+
+def evaluate(model, scaler, test):
+    '''
+    R², RMSE and MAE of a model on held-out processed_data rows
+    '''
+    predictions = predict_frame(model, scaler, test)
+    errors = test['price'].to_numpy() - predictions
+    return {
+        'r2': float(1 - (errors ** 2).sum() / ((test['price'] - test['price'].mean()) ** 2).sum()),
+        'rmse': float(np.sqrt((errors ** 2).mean())),
+        'mae': float(np.abs(errors).mean()),
+    }
+
+
+def register(name, model, scaler, metrics=None, training_data=artifacts.PROCESSED_DATA_PATH, registry_dir=REGISTRY_DIR,
+             extra=None):
+    '''
+    Save a model/scaler bundle as a new version of name, with the metadata needed to serve and
+    compare it (plus any extra fields). Returns the metadata
+    '''
+    version = created = time.strftime('%Y%m%dT%H%M%S')
+    attempt = 1
+    while os.path.exists(os.path.join(registry_dir, name, version)):
+        attempt += 1
+        version = f'{created}-{attempt}'
+    # Written under a hidden name and renamed, so a reader following the latest version never
+    # sees a bundle with only some of its files
+    tmp_dir = os.path.join(registry_dir, name, f'.{version}.tmp')
+    os.makedirs(tmp_dir)
+    joblib.dump(model, os.path.join(tmp_dir, MODEL_FILE))
+    joblib.dump(scaler, os.path.join(tmp_dir, SCALER_FILE))
+    metadata = {
+        'name': name,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model_class': f'{type(model).__module__}.{type(model).__name__}',
+        'feature_columns': FEATURE_COLUMNS,
+        'training_data': training_data,
+        'training_data_hash': file_hash(training_data),
+        'scaler_hash': scaler_hash(scaler),
+        'metrics': metrics or {},
+        **(extra or {}),
+    }
+    with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.rename(tmp_dir, os.path.join(registry_dir, name, version))
+    return metadata
+
+
+def _version_key(version):
+    # Versions registered within the same second get a numeric suffix from -2 up, so -10 sorts after -9
+    created, _, attempt = version.partition('-')
+    return created, int(attempt) if attempt.isdigit() else 1
+
+
+def _versions(name_dir):
+    if not os.path.isdir(name_dir):
+        return []
+    return sorted((version for version in os.listdir(name_dir) if not version.startswith('.')), key=_version_key)
+
+
+def list_models(registry_dir=REGISTRY_DIR):
+    '''
+    Metadata of every registered version, grouped by name and oldest first
+    '''
+    models = []
+    if not os.path.isdir(registry_dir):
+        return models
+    for name in sorted(os.listdir(registry_dir)):
+        name_dir = os.path.join(registry_dir, name)
+        if not os.path.isdir(name_dir):
+            continue
+        for version in _versions(name_dir):
+            metadata_path = os.path.join(name_dir, version, METADATA_FILE)
+            if os.path.exists(metadata_path):
+                with open(metadata_path) as f:
+                    models.append(json.load(f))
+    return models
+
+
+def parse_spec(spec):
+    '''
+    Split "name" or "name:version" into (name, version or None)
+    '''
+    name, _, version = spec.partition(':')
+    return name, version or None
+
+
+def bundle_dir(name, version=None, registry_dir=REGISTRY_DIR):
+    '''
+    Directory of a registered bundle, the latest version of name when version is None
+    '''
+    name_dir = os.path.join(registry_dir, name)
+    versions = _versions(name_dir)
+    if not versions or (version is not None and version not in versions):
+        raise ValueError(f"Model {name}{':' + version if version else ''} is not registered in {registry_dir}")
+    return os.path.join(name_dir, version or versions[-1])
+
+
+def load_metadata(name, version=None, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(bundle_dir(name, version, registry_dir), METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def load_bundle(name, version=None, registry_dir=REGISTRY_DIR):
+    '''
+    Model, scaler and metadata of a registered bundle, through the process-wide artifact cache
+    '''
+    directory = bundle_dir(name, version, registry_dir)
+    metadata = load_metadata(name, os.path.basename(directory), registry_dir)
+    if metadata['feature_columns'] != FEATURE_COLUMNS:
+        raise ValueError(f"Model {name} was trained on different features than this app provides")
+    model = artifacts.load_model(os.path.join(directory, MODEL_FILE))
+    scaler = artifacts.load_scaler(os.path.join(directory, SCALER_FILE))
+    return model, scaler, metadata
+
+
+def set_active(name, version=None, registry_dir=REGISTRY_DIR):
+    '''
+    Make a registered model (pinned to version, or following its latest version) the one the app serves
+    '''
+    bundle_dir(name, version, registry_dir)
+    path = os.path.join(registry_dir, ACTIVE_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({'name': name, 'version': version}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def active_model(registry_dir=REGISTRY_DIR):
+    '''
+    (name, version) of the model to serve: HOUSE_PRICE_MODEL ("name" or "name:version"), else the
+    registry's active model, else None for the original artifacts/xgb_model.pkl
+    '''
+    spec = os.environ.get('HOUSE_PRICE_MODEL')
+    if spec:
+        return parse_spec(spec)
+    path = os.path.join(registry_dir, ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        active = json.load(f)
+    return active['name'], active['version']
+
+
+def active_paths(registry_dir=REGISTRY_DIR):
+    '''
+    Model and scaler files of the active model
+    '''
+    active = active_model(registry_dir)
+    if active is None:
+        return artifacts.MODEL_PATH, artifacts.SCALER_PATH
+    directory = bundle_dir(*active, registry_dir=registry_dir)
+    return os.path.join(directory, MODEL_FILE), os.path.join(directory, SCALER_FILE)
+
+
+def compare(registry_dir=REGISTRY_DIR, batch_size=1000, repeat=5):
+    '''
+    Side-by-side hold-out accuracy and prediction latency of the latest version of every registered model
+    '''
+    _, test = holdout_split()
+    rows = []
+    for name in sorted({metadata['name'] for metadata in list_models(registry_dir)}):
+        model, scaler, metadata = load_bundle(name, registry_dir=registry_dir)
+        batch = test.iloc[np.arange(batch_size) % len(test)]
+        timings = {}
+        for label, frame in (('single_row_ms', test.iloc[:1]), ('batch_ms', batch)):
+            predict_frame(model, scaler, frame)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                predict_frame(model, scaler, frame)
+            timings[label] = (time.perf_counter() - start) / repeat * 1000
+        rows.append({'name': name, 'version': metadata['version'], **evaluate(model, scaler, test), **timings})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Registry of versioned model/scaler bundles')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='registered models and their hold-out metrics')
+    legacy = commands.add_parser('register-legacy', help='register artifacts/xgb_model.pkl and scaler.pkl')
+    legacy.add_argument('--name', default='xgboost')
+    train = commands.add_parser('train', help='train one of the notebook regressors and register it')
+    train.add_argument('model', choices=list(candidate_models()))
+    train.add_argument('--name', help='registry name (defaults to the model)')
+    promote = commands.add_parser('promote', help='serve a registered model')
+    promote.add_argument('model', help='name or name:version')
+    commands.add_parser('compare', help='hold-out accuracy and latency of every registered model')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        active = active_model()
+        for metadata in list_models():
+            marker = '*' if active and active[0] == metadata['name'] and active[1] in (None, metadata['version']) else ' '
+            scores = ', '.join(f"{key}={value:,.3f}" for key, value in metadata['metrics'].items())
+            print(f"{marker} {metadata['name']}:{metadata['version']}  {metadata['model_class']}  {scores}")
+    elif args.command == 'register-legacy':
+        model = artifacts.load_model(artifacts.MODEL_PATH)
+        scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+        _, test = holdout_split()
+        metadata = register(args.name, model, scaler, evaluate(model, scaler, test))
+        print(f"Registered {metadata['name']}:{metadata['version']} {metadata['metrics']}")
+    elif args.command == 'train':
+        from sklearn.preprocessing import StandardScaler
+
+        train_rows, test = holdout_split()
+        scaler = StandardScaler().fit(train_rows[FEATURE_COLUMNS].astype(np.float64))
+        model = candidate_models()[args.model]()
+        model.fit(scaler.transform(train_rows[FEATURE_COLUMNS].astype(np.float64)), train_rows['price'])
+        metadata = register(args.name or args.model, model, scaler, evaluate(model, scaler, test))
+        print(f"Registered {metadata['name']}:{metadata['version']} {metadata['metrics']}")
+    elif args.command == 'promote':
+        set_active(*parse_spec(args.model))
+        print(f"Now serving {args.model}")
+    elif args.command == 'compare':
+        print(compare().round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
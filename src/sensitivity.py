@@ -0,0 +1,112 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import artifacts, metrics
+from src.features import house_age
+from src.predict import FEATURE_COLUMNS, predict_frame
+
+# (min, max, step) swept for each feature; step None means evenly spaced points. Ranges follow
+# the Prediction page inputs, narrowed to where most King County sales lie for the area columns
+SWEEP_RANGES = {
+    'bedrooms': (1, 10, 1),
+    'bathrooms': (1.0, 8.0, 0.25),
+    'sqft_living': (500, 6000, 10),
+    'sqft_lot': (1000, 50000, 10),
+    'floors': (1.0, 3.5, 0.5),
+    'waterfront': (0, 1, 1),
+    'view': (0, 4, 1),
+    'condition': (1, 5, 1),
+    'grade': (1, 13, 1),
+    'sqft_above': (500, 5000, 10),
+    'sqft_basement': (0, 2000, 10),
+    'yr_built': (1900, 2015, 1),
+    'yr_renovated': (0, 2015, 1),
+    'lat': (47.1559, 47.7776, None),
+    'long': (-122.518, -121.315, None),
+    'sqft_living15': (500, 5000, 10),
+    'sqft_lot15': (1000, 30000, 10),
+    'year': (2014, 2015, 1),
+    'month': (1, 12, 1),
+}
+
+
+def sweep_values(feature, points=25):
+    '''
+    Values of one feature to sweep: every step when that gives at most `points` values,
+    otherwise `points` evenly spaced values rounded to the step
+    '''
+    low, high, step = SWEEP_RANGES[feature]
+    if step is not None and (high - low) / step + 1 <= points:
+        return np.arange(low, high + step / 2, step)
+    values = np.linspace(low, high, points)
+    if step is not None:
+        values = np.unique(np.round(values / step) * step)
+    return values
+
+
+def sweep_grid(base, values):
+    '''
+    One row per combination of the swept values (a dict of feature -> values), with every other
+    feature taken from the base house. house_age follows yr_built and year when they are swept
+    '''
+    grids = np.meshgrid(*values.values(), indexing='ij')
+    rows = grids[0].size
+    grid = pd.DataFrame({column: np.full(rows, base[column], dtype=np.float64) for column in FEATURE_COLUMNS})
+    for feature, grid_values in zip(values, grids):
+        grid[feature] = grid_values.ravel()
+    if 'yr_built' in values or 'year' in values:
+        grid['house_age'] = house_age(grid['year'], grid['yr_built'])
+    return grid
+
+
+def sweep(model, scaler, base, values):
+    '''
+    Predicted price for every combination of the swept values, scored in one batched call.
+    Returns the swept columns and predicted_price
+    '''
+    with metrics.timed('sensitivity_sweep'):
+        grid = sweep_grid(base, values)
+        result = grid[list(values)].copy()
+        result['predicted_price'] = predict_frame(model, scaler, grid)
+    return result
+
+
+def benchmark(points=25, repeats=20):
+    '''
+    Milliseconds for one single-row prediction and for 1-D and 2-D sweeps of `points` values per feature
+    '''
+    model = artifacts.load_model(artifacts.MODEL_PATH)
+    scaler = artifacts.load_scaler(artifacts.SCALER_PATH)
+    base = artifacts.load_processed_data(artifacts.PROCESSED_DATA_PATH)[FEATURE_COLUMNS].iloc[0].to_dict()
+    cases = {
+        'single prediction': lambda: predict_frame(model, scaler, pd.DataFrame([base])),
+        f'1-D sweep ({len(sweep_values("sqft_living", points))} points)':
+            lambda: sweep(model, scaler, base, {'sqft_living': sweep_values('sqft_living', points)}),
+        f'2-D sweep ({len(sweep_values("sqft_living", points)) * len(sweep_values("grade", points))} points)':
+            lambda: sweep(model, scaler, base, {'sqft_living': sweep_values('sqft_living', points),
+                                                'grade': sweep_values('grade', points)}),
+    }
+    results = {}
+    for name, run in cases.items():
+        run()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            run()
+        results[name] = (time.perf_counter() - start) / repeats * 1000
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time what-if sensitivity sweeps against a single prediction')
+    parser.add_argument('--points', type=int, default=25, help='values per swept feature')
+    args = parser.parse_args(argv)
+
+    for name, milliseconds in benchmark(args.points).items():
+        print(f"{name}: {milliseconds:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
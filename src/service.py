@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from src import artifacts, registry
+from src.drift import get_monitor
+from src.metrics import is_enabled, snapshot, start_exporters
+from src.predict import FEATURE_COLUMNS, predict_scaled, scale_frame
+from src.prediction_cache import PredictionCache
+from src.shadow import ShadowScorer, load_candidates
+
+
+class MicroBatcher:
+    '''
+    Collect concurrent prediction requests for up to window_ms and score them as one batch.
+    With resolve, a callable returning (model, scaler), the pair is looked up again for every
+    batch, so a newly promoted or refreshed model is served from the next batch on
+    '''
+
+    def __init__(self, model, scaler, window_ms=3.0, max_batch=256, shadow=None, resolve=None):
+        self.model = model
+        self.scaler = scaler
+        self.resolve = resolve
+        self.shadow = shadow
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.batched_rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        '''
+        Queue a list of feature rows and return a Future resolving to their predictions
+        '''
+        future = Future()
+        self._queue.put((rows, future))
+        return future
+
+    def _run(self):
+        while True:
+            # Block for the first request, then gather whatever arrives within the window
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.perf_counter() + self.window
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._score(pending, size)
+
+    def _score(self, pending, size):
+        rows = [row for request_rows, _ in pending for row in request_rows]
+        try:
+            if self.resolve is not None:
+                # Artifact cache hits: a stat per file unless the model changed
+                self.model, self.scaler = self.resolve()
+            frame = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+            start = time.perf_counter()
+            features = scale_frame(self.scaler, frame)
+            predictions = predict_scaled(self.model, features)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_rows += size
+        offset = 0
+        for request_rows, future in pending:
+            future.set_result(predictions[offset:offset + len(request_rows)].tolist())
+            offset += len(request_rows)
+        # Candidates are scored after the responses are released, on the shadow scorer's own thread
+        if self.shadow is not None:
+            self.shadow.submit(frame, features, predictions, elapsed, self.scaler)
+
+
+class LatencyStats:
+    '''
+    Request latencies over a bounded window of recent requests
+    '''
+
+    def __init__(self, window=10_000):
+        self.latencies = deque(maxlen=window)
+        self.timestamps = deque(maxlen=window)
+        self.requests = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.timestamps.append(time.time())
+            self.requests += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self.latencies)
+            timestamps = list(self.timestamps)
+            requests = self.requests
+        now = time.time()
+        # Throughput over the last 10 seconds, or since start-up if that is shorter
+        span = min(10.0, now - self.started)
+        recent = sum(1 for t in timestamps if t >= now - span)
+        return {
+            'requests': requests,
+            'requests_per_sec': recent / span if span > 0 else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99) * 1000) if len(latencies) else None,
+        }
+
+
+def parse_rows(payload):
+    '''
+    Turn a JSON object or list of objects with the 20 features into rows in training order
+    '''
+    records = payload if isinstance(payload, list) else [payload]
+    rows = []
+    for record in records:
+        missing = [column for column in FEATURE_COLUMNS if column not in record]
+        if missing:
+            raise ValueError(f"Missing features: {', '.join(missing)}")
+        rows.append([float(record[column]) for column in FEATURE_COLUMNS])
+    return rows
+
+
+def make_handler(batcher, stats, cache, monitor, model_info):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/shadow':
+                if batcher.shadow is None:
+                    self._send_json(404, {'error': 'No shadow models (start with --shadow NAME)'})
+                else:
+                    self._send_json(200, batcher.shadow.report())
+            elif self.path == '/drift':
+                self._send_json(200, monitor.report())
+            elif self.path == '/metrics':
+                metrics = stats.summary()
+                metrics['model'] = model_info()
+                metrics['batches'] = batcher.batches
+                metrics['mean_batch_size'] = batcher.batched_rows / batcher.batches if batcher.batches else 0.0
+                metrics['cache'] = cache.stats()
+                metrics['drift'] = monitor.summary()
+                if is_enabled():
+                    metrics['stages'] = snapshot()
+                self._send_json(200, metrics)
+            else:
+                self._send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            start = time.perf_counter()
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = parse_rows(payload)
+            except (ValueError, TypeError, AttributeError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                # Only rows missing from the cache are sent to the batcher
+                predictions = cache.predict(rows, lambda missing: batcher.submit(missing).result()).tolist()
+            except Exception as e:
+                self._send_json(500, {'error': f"Error predicting price: {e}"})
+                return
+            try:
+                # Compared against the training data in a few microseconds per row, before responding
+                flags = monitor.observe(rows, predictions)
+            except Exception:
+                # Monitoring never costs the caller their prediction
+                flags = []
+            stats.record(time.perf_counter() - start)
+            body = {'predicted_price': predictions if isinstance(payload, list) else predictions[0]}
+            if any(flags):
+                body['out_of_range'] = flags if isinstance(payload, list) else flags[0]
+            self._send_json(200, body)
+
+        def log_message(self, format, *args):
+            # Per-request access logs would dominate the cost of a prediction
+            pass
+
+    return PredictionHandler
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under concurrent load, which clients
+    # see as one-second SYN retransmits in the tail latency
+    request_queue_size = 128
+
+
+def create_server(host='127.0.0.1', port=8000, window_ms=3.0, max_batch=256, model_name=None,
+                  compiled_path=None, cache_size=10_000, shadow_models=()):
+    '''
+    Serve the registered model model_name ("name" or "name:version"), the registry's active model
+    when None, or a compiled model. shadow_models are registered models scored alongside it
+    '''
+    if compiled_path:
+        # The compiled model takes raw features and never imports xgboost or scikit-learn
+        from src.compiled import CompiledModel
+
+        def resolve():
+            return artifacts.load_artifact(compiled_path, CompiledModel.load), None
+
+        cache = PredictionCache(maxsize=cache_size, model_path=compiled_path, scaler_path=None)
+        def model_info():
+            return {'name': 'compiled', 'path': compiled_path}
+    elif model_name:
+        # Pinned to the version that is latest now, checked against this app's features by load_bundle
+        _, _, metadata = registry.load_bundle(*registry.parse_spec(model_name))
+        version = (metadata['name'], metadata['version'])
+        directory = registry.bundle_dir(*version)
+        model_path = os.path.join(directory, registry.MODEL_FILE)
+        scaler_path = os.path.join(directory, registry.SCALER_FILE)
+
+        def resolve():
+            return registry.load_bundle(*version)[:2]
+
+        cache = PredictionCache(maxsize=cache_size, model_path=model_path, scaler_path=scaler_path)
+        def model_info():
+            return {'name': model_name, 'path': model_path}
+    else:
+        # Follow the registry's active model, as the Prediction page does
+        def resolve():
+            active = registry.active_model()
+            if active is None:
+                return artifacts.load_model(artifacts.MODEL_PATH), artifacts.load_scaler(artifacts.SCALER_PATH)
+            return registry.load_bundle(*active)[:2]
+
+        cache = PredictionCache(maxsize=cache_size, follow_active=True)
+        def model_info():
+            return {'name': ':'.join(filter(None, registry.active_model() or ())) or 'default',
+                    'path': registry.active_paths()[0]}
+    model, scaler = resolve()
+    shadow = ShadowScorer(load_candidates(shadow_models), scaler) if shadow_models else None
+    batcher = MicroBatcher(model, scaler, window_ms, max_batch, shadow, resolve)
+    return PredictionServer((host, port), make_handler(batcher, LatencyStats(), cache, get_monitor(), model_info))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='JSON house price prediction service with request micro-batching')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--window-ms', type=float, default=3.0, help='time to wait for more requests before scoring a batch')
+    parser.add_argument('--max-batch', type=int, default=256, help='rows scored per batch at most')
+    parser.add_argument('--model', help='registered model to serve, as name or name:version (default: the active model)')
+    parser.add_argument('--shadow', action='append', default=[], help='registered model to score alongside the served one (repeatable)')
+    parser.add_argument('--compiled', help='serve a NumPy model exported with python -m src.compiled export')
+    parser.add_argument('--cache-size', type=int, default=10_000, help='predictions kept in the LRU cache (0 disables it)')
+    args = parser.parse_args(argv)
+
+    start_exporters()
+    server = create_server(args.host, args.port, args.window_ms, args.max_batch, model_name=args.model,
+                           compiled_path=args.compiled, cache_size=args.cache_size, shadow_models=args.shadow)
+    print(f"Serving predictions on http://{args.host}:{args.port} (POST /predict, GET /metrics, GET /drift, GET /shadow)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
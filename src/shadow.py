@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from src import registry
+from src.predict import FEATURE_COLUMNS
+
+
+class ShadowScorer:
+    '''
+    Score every batch the primary model served with candidate models on a background thread, and
+    record how far their predictions are from the primary's and how long they take. The primary
+    response never waits for the candidates: batches arriving while the queue is full are skipped
+    '''
+
+    def __init__(self, candidates, primary_scaler, max_pending=16, window=10_000):
+        # candidates maps a label such as "random_forest:20240601T120000" to (model, scaler)
+        self.candidates = {label: (model, scaler, registry.scaler_hash(scaler)) for label, (model, scaler) in candidates.items()}
+        self._primary_scaler = primary_scaler
+        self.primary_scaler_hash = registry.scaler_hash(primary_scaler)
+        self.skipped = 0
+        self._primary_latencies = deque(maxlen=window)
+        self._stats = {label: {'rows': 0, 'batches': 0, 'sum_delta': 0.0, 'sum_abs_delta': 0.0,
+                               'sum_abs_pct_delta': 0.0, 'max_abs_delta': 0.0, 'errors': 0,
+                               'latencies': deque(maxlen=window)} for label in candidates}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, primary_scaled, primary_predictions, primary_seconds, primary_scaler=None):
+        '''
+        Queue a scored batch: the feature DataFrame, the scaled features the primary model saw, its
+        predictions and how long it took, and the primary scaler when it may have changed since
+        start-up. Returns immediately
+        '''
+        try:
+            self._queue.put_nowait((frame, primary_scaled, np.asarray(primary_predictions), primary_seconds, primary_scaler))
+        except queue.Full:
+            self.skipped += 1
+
+    def _run(self):
+        while True:
+            try:
+                self._score(*self._queue.get())
+            finally:
+                self._queue.task_done()
+
+    def _score(self, frame, primary_scaled, primary, primary_seconds, primary_scaler):
+        # Candidates sharing the primary's scaler reuse its scaled batch; others are scaled once per scaler
+        # The hash is only recomputed when the service switched scalers; None keeps the last known one
+        if primary_scaler is not None and primary_scaler is not self._primary_scaler:
+            self._primary_scaler = primary_scaler
+            self.primary_scaler_hash = registry.scaler_hash(primary_scaler)
+        scaled = {self.primary_scaler_hash: primary_scaled}
+        with self._lock:
+            self._primary_latencies.append(primary_seconds)
+        for label, (model, scaler, key) in self.candidates.items():
+            try:
+                start = time.perf_counter()
+                if key not in scaled:
+                    scaled[key] = frame[FEATURE_COLUMNS].to_numpy() if scaler is None else scaler.transform(frame[FEATURE_COLUMNS])
+                predictions = model.predict(scaled[key])
+                elapsed = time.perf_counter() - start
+            except Exception:
+                with self._lock:
+                    self._stats[label]['errors'] += 1
+                continue
+            delta = predictions - primary
+            with self._lock:
+                stats = self._stats[label]
+                stats['rows'] += len(delta)
+                stats['batches'] += 1
+                stats['sum_delta'] += float(delta.sum())
+                stats['sum_abs_delta'] += float(np.abs(delta).sum())
+                stats['sum_abs_pct_delta'] += float((np.abs(delta) / np.maximum(np.abs(primary), 1.0)).sum())
+                stats['max_abs_delta'] = max(stats['max_abs_delta'], float(np.abs(delta).max()))
+                stats['latencies'].append(elapsed)
+
+    def report(self):
+        '''
+        Per candidate: rows scored, mean and mean absolute difference from the primary prediction,
+        and batch latency percentiles next to the primary model's
+        '''
+        def percentiles(latencies):
+            if not latencies:
+                return {'p50_ms': None, 'p99_ms': None}
+            latencies = np.array(latencies) * 1000
+            return {'p50_ms': float(np.percentile(latencies, 50)), 'p99_ms': float(np.percentile(latencies, 99))}
+
+        with self._lock:
+            report = {'primary': percentiles(self._primary_latencies), 'skipped_batches': self.skipped, 'candidates': {}}
+            for label, stats in self._stats.items():
+                rows = stats['rows']
+                report['candidates'][label] = {
+                    'rows': rows,
+                    'errors': stats['errors'],
+                    'mean_delta': stats['sum_delta'] / rows if rows else None,
+                    'mean_abs_delta': stats['sum_abs_delta'] / rows if rows else None,
+                    'mean_abs_pct_delta': stats['sum_abs_pct_delta'] / rows * 100 if rows else None,
+                    'max_abs_delta': stats['max_abs_delta'] if rows else None,
+                    **percentiles(stats['latencies']),
+                }
+            return report
+
+    def drain(self, timeout=10.0):
+        '''
+        Wait until every queued batch has been scored, e.g. before reading the report in a test or benchmark
+        '''
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+
+def load_candidates(specs, registry_dir=registry.REGISTRY_DIR):
+    '''
+    Models to shadow-score from "name" or "name:version" specs
+    '''
+    candidates = {}
+    for spec in specs:
+        model, scaler, metadata = registry.load_bundle(*registry.parse_spec(spec), registry_dir=registry_dir)
+        candidates[f"{metadata['name']}:{metadata['version']}"] = (model, scaler)
+    return candidates
@@ -0,0 +1,184 @@
+import argparse
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from src import metrics
+
+# Libraries behind the pages, imported by the warmup thread so no visitor pays for them
+HEAVY_MODULES = ['numpy', 'pandas', 'pyarrow.feather', 'joblib', 'sklearn.neighbors', 'xgboost',
+                 'plotly.express', 'plotly.graph_objects']
+PAGES = ['Home.py', 'pages/1_Visualization.py', 'pages/2_Prediction.py']
+
+_status = {}
+_thread = None
+_lock = threading.Lock()
+
+
+def _import_modules():
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+
+def _load_model():
+    from src import artifacts, registry
+
+    model_path, scaler_path = registry.active_paths()
+    artifacts.load_model(model_path)
+    artifacts.load_scaler(scaler_path)
+
+
+def _load_drift_reference():
+    from src import drift
+
+    drift.get_monitor()
+
+
+def _load_dataset():
+    from src import aggregates, artifacts, storage
+
+    artifacts.load_artifact(artifacts.RAW_DATA_PATH, storage.read_dataset)
+    artifacts.load_artifact(artifacts.RAW_DATA_PATH, aggregates.load_summary)
+
+
+def _load_comps_index():
+    from src import comps
+
+    comps.load_index()
+
+
+# Run in order by the warmup thread: the Prediction page's needs first, then the Visualization page's
+WARMUP_STEPS = [
+    ('imports', _import_modules),
+    ('model', _load_model),
+    ('comps_index', _load_comps_index),
+    ('drift_reference', _load_drift_reference),
+    ('dataset', _load_dataset),
+]
+
+
+def warmup():
+    '''
+    Import the heavy libraries and load every artifact the pages use into the process-wide caches.
+    A failing step is recorded and skipped; the page that needs it reports the error itself
+    '''
+    for name, step in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            _status[name] = f'error: {e}'
+            continue
+        seconds = time.perf_counter() - start
+        metrics.record(f'warmup/{name}', seconds)
+        _status[name] = seconds
+
+
+def start_warmup():
+    '''
+    Start warming up in a background thread, once per process. Disabled with HOUSE_PRICE_WARMUP=0
+    '''
+    global _thread
+    if os.environ.get('HOUSE_PRICE_WARMUP', '1') == '0':
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warmup, name='warmup', daemon=True)
+            _thread.start()
+
+
+def warmup_status():
+    '''
+    Seconds spent on each finished warmup step (or its error), and whether warmup is still running
+    '''
+    return {'running': _thread is not None and _thread.is_alive(), 'steps': dict(_status)}
+
+
+def script_imports(file_path):
+    '''
+    Modules imported at the top level of a script, e.g. a Streamlit page
+    '''
+    with open(file_path) as f:
+        tree = ast.parse(f.read(), file_path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules += [f'{node.module}.{alias.name}' if node.module == 'src' else node.module for alias in node.names]
+    return list(dict.fromkeys(modules))
+
+
+def import_times(modules):
+    '''
+    Import the modules in a fresh interpreter with -X importtime. Returns one entry per module
+    loaded, with its own import time, its cumulative time (including what it imported) and
+    whether it was imported directly by the modules rather than by one of their dependencies
+    '''
+    code = 'import ' + ', '.join(modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', code],
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+            'top_level': not name[1:].startswith(' '),
+        })
+    return entries
+
+
+def import_breakdown(modules):
+    '''
+    Import time per top-level package (summing every submodule's own time), most expensive first,
+    and the total
+    '''
+    packages = {}
+    entries = import_times(modules)
+    for entry in entries:
+        package = entry['module'].split('.')[0]
+        packages[package] = packages.get(package, 0.0) + entry['self_ms']
+    total = sum(entry['cumulative_ms'] for entry in entries if entry['top_level'])
+    return sorted(packages.items(), key=lambda item: -item[1]), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Startup cost of the web app')
+    commands = parser.add_subparsers(dest='command', required=True)
+    imports = commands.add_parser('imports', help='import time per package for each page (or the given scripts or modules)')
+    imports.add_argument('targets', nargs='*', default=PAGES, help='script paths or module names')
+    imports.add_argument('--top', type=int, default=15)
+    imports.add_argument('--json', help='also write the breakdown to this file')
+    warm = commands.add_parser('warmup', help='run the warmup steps and report their times')
+    args = parser.parse_args(argv)
+
+    if args.command == 'warmup':
+        warmup()
+        for name, result in warmup_status()['steps'].items():
+            print(f"{name:15s} {result * 1000:10.1f} ms" if isinstance(result, float) else f"{name:15s} {result}")
+        return
+
+    report = {}
+    for target in args.targets:
+        modules = script_imports(target) if target.endswith('.py') else [target]
+        packages, total = import_breakdown(modules)
+        report[target] = {'total_ms': total, 'packages': dict(packages)}
+        print(f"{target}: {total:.0f} ms to import {', '.join(modules)}")
+        for package, milliseconds in packages[:args.top]:
+            print(f"    {package:30s} {milliseconds:8.1f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from src import metrics
+from src.metrics import rss_bytes
+
+# Narrowest dtype that holds every value of each column in the King County data exactly. price, lat and
+# long stay float64: they feed the model, and float32 would round the coordinates (47.7776 -> 47.77759933)
+COLUMN_DTYPES = {
+    'id': 'int64',
+    'price': 'float64',
+    'bedrooms': 'int8',
+    'bathrooms': 'float32',
+    'sqft_living': 'int32',
+    'sqft_lot': 'int32',
+    'floors': 'float32',
+    'waterfront': 'int8',
+    'view': 'int8',
+    'condition': 'int8',
+    'grade': 'int8',
+    'sqft_above': 'int32',
+    'sqft_basement': 'int32',
+    'yr_built': 'int16',
+    'yr_renovated': 'int16',
+    'zipcode': 'int32',
+    'lat': 'float64',
+    'long': 'float64',
+    'sqft_living15': 'int32',
+    'sqft_lot15': 'int32',
+    'year': 'int16',
+    'month': 'int8',
+    'house_age': 'int16',
+}
+# Recorded in each Arrow copy, so copies written with older dtypes are ignored until reconverted
+DTYPES_VERSION = b'2'
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.arrow'
+
+
+def to_typed(df):
+    '''
+    Downcast known columns and parse the raw date strings (20141013T000000) into datetimes
+    '''
+    df = df.astype({column: dtype for column, dtype in COLUMN_DTYPES.items() if column in df.columns})
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'], format='%Y%m%dT%H%M%S')
+    return df
+
+
+def convert_csv(csv_path, output_path=None):
+    '''
+    Write a typed, uncompressed Arrow IPC (Feather v2) copy of a CSV that can be memory-mapped
+    '''
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    output_path = output_path or columnar_path(csv_path)
+    table = pa.Table.from_pandas(to_typed(pd.read_csv(csv_path)), preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b'dtypes_version': DTYPES_VERSION})
+    # Uncompressed so that reads are zero-copy views of the mapped file
+    feather.write_feather(table, output_path, compression='uncompressed')
+    return output_path
+
+
+def is_current(csv_path):
+    '''
+    Whether the columnar copy of a CSV exists, is at least as new as the CSV and has the current dtypes
+    '''
+    path = columnar_path(csv_path)
+    if not os.path.exists(path) or (os.path.exists(csv_path) and os.path.getmtime(path) < os.path.getmtime(csv_path)):
+        return False
+    try:
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except ImportError:
+        return False
+    return metadata.get(b'dtypes_version') == DTYPES_VERSION
+
+
+def read_columnar(file_path, columns=None):
+    '''
+    Memory-map an Arrow file and read only the requested columns
+    '''
+    import pyarrow.feather as feather
+
+    return feather.read_table(file_path, columns=columns, memory_map=True).to_pandas(split_blocks=True)
+
+
+def read_dataset(csv_path, columns=None):
+    '''
+    Read a dataset from its columnar copy when one is current, otherwise from the CSV.
+    Only the requested columns are loaded either way
+    '''
+    with metrics.timed('read_dataset'):
+        if is_current(csv_path):
+            try:
+                return read_columnar(columnar_path(csv_path), columns)
+            except ImportError:
+                pass
+        return pd.read_csv(csv_path, usecols=columns)
+
+
+def _measure(read):
+    rss = rss_bytes()
+    start = time.perf_counter()
+    df = read()
+    seconds = time.perf_counter() - start
+    after = rss_bytes()
+    return {
+        'seconds': seconds,
+        'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        'rss_delta_bytes': after - rss if rss is not None and after is not None else None,
+    }
+
+
+def benchmark(csv_path, columns=None):
+    '''
+    Compare load time and memory of the CSV and its columnar copy, for all columns and a projection
+    '''
+    arrow_path = columnar_path(csv_path)
+    if not os.path.exists(arrow_path):
+        convert_csv(csv_path)
+    columns = columns or ['price', 'sqft_living']
+    return {
+        'csv': _measure(lambda: pd.read_csv(csv_path)),
+        'csv_projected': _measure(lambda: pd.read_csv(csv_path, usecols=columns)),
+        'columnar': _measure(lambda: read_columnar(arrow_path)),
+        'columnar_projected': _measure(lambda: read_columnar(arrow_path, columns)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert the housing CSVs to typed, memory-mappable Arrow files')
+    parser.add_argument('command', choices=['convert', 'benchmark'])
+    parser.add_argument('csv', nargs='+', help='CSV files to convert or benchmark')
+    args = parser.parse_args(argv)
+
+    for csv_path in args.csv:
+        if args.command == 'convert':
+            print(f"Wrote {convert_csv(csv_path)}")
+        else:
+            print(csv_path)
+            print(json.dumps(benchmark(csv_path), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBRegressor
+
+from src import artifacts
+from src.predict import FEATURE_COLUMNS
+
+# Same search space as the GridSearchCV in notebooks/Model.ipynb. n_estimators is no longer
+# searched: every config boosts up to the round budget and early stopping picks the count
+PARAM_GRID = {
+    'max_depth': [3, 5, 7],
+    'learning_rate': [0.01, 0.1, 0.3],
+}
+MAX_ROUNDS = 1000
+TRIALS_PATH = 'artifacts/tuning_trials.jsonl'
+# Part of each training fold held out to pick the round count, so the scored fold stays unseen
+EARLY_STOPPING_FRACTION = 0.1
+# Bumped when evaluate_fold changes, so trials stored by an older version are not reused
+EVALUATION_VERSION = 2
+
+
+def load_training_data(file_path=artifacts.PROCESSED_DATA_PATH, test_size=0.2, random_state=42):
+    '''
+    Split processed_data.csv exactly as the notebook does and fit the scaler on the training part
+    '''
+    df = artifacts.load_processed_data(file_path)
+    X = df[FEATURE_COLUMNS].astype(np.float64)
+    y = df['price'].astype(np.float64)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    scaler = StandardScaler()
+    scaler.fit(X_train)
+    return scaler, scaler.transform(X_train), scaler.transform(X_test), y_train.to_numpy(), y_test.to_numpy()
+
+
+def data_hash(*arrays):
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def trial_key(params, rounds, fold, folds, data_version):
+    return json.dumps([params, rounds, fold, folds, data_version, EVALUATION_VERSION], sort_keys=True)
+
+
+class TrialStore:
+    '''
+    Append-only JSON lines file of completed (config, round budget, fold) evaluations,
+    so an interrupted search resumes where it stopped
+    '''
+
+    def __init__(self, file_path=TRIALS_PATH):
+        self.file_path = file_path
+        self.results = {}
+        if os.path.exists(file_path):
+            with open(file_path) as f:
+                for line in f:
+                    # A line cut short by an interruption is simply evaluated again
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[record['key']] = record
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def add(self, record):
+        self.results[record['key']] = record
+        with open(self.file_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def evaluate_fold(params, rounds, X, y, train_index, val_index, early_stopping_rounds=50):
+    '''
+    Train one config on one fold and score it on the held-out part. Early stopping watches a
+    slice of the training part, never the scored fold, so the fold score stays unbiased
+    '''
+    start = time.perf_counter()
+    fit_index, stop_index = train_test_split(train_index, test_size=EARLY_STOPPING_FRACTION, random_state=42)
+    model = XGBRegressor(n_estimators=rounds, early_stopping_rounds=early_stopping_rounds, n_jobs=1, **params)
+    model.fit(X[fit_index], y[fit_index], eval_set=[(X[stop_index], y[stop_index])], verbose=False)
+    predictions = model.predict(X[val_index])
+    return {
+        'r2': float(r2_score(y[val_index], predictions)),
+        'rmse': float(np.sqrt(mean_squared_error(y[val_index], predictions))),
+        'best_iteration': int(model.best_iteration),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def successive_halving(X, y, store, param_grid=PARAM_GRID, max_rounds=MAX_ROUNDS, eta=3, rungs=3,
+                       folds=5, n_jobs=-1, verbose=True):
+    '''
+    Evaluate every config with a small round budget, keep the best 1/eta of them and repeat with
+    eta times the budget, up to max_rounds. Folds of all configs in a rung run in parallel, and
+    evaluations already in the store are reused instead of being trained again
+    '''
+    configs = [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X))
+    data_version = data_hash(X, y)
+
+    summary = []
+    for rung in range(rungs):
+        rounds = max(1, math.ceil(max_rounds / eta ** (rungs - 1 - rung)))
+        tasks = [(params, fold) for params in configs for fold in range(folds)
+                 if store.get(trial_key(params, rounds, fold, folds, data_version)) is None]
+        if verbose:
+            print(f"Rung {rung + 1}/{rungs}: {len(configs)} configs x {rounds} rounds, "
+                  f"{len(configs) * folds - len(tasks)} folds cached, {len(tasks)} to train")
+
+        # Results are stored as they complete, so an interruption loses at most the running folds
+        results = Parallel(n_jobs=n_jobs, return_as='generator')(
+            delayed(evaluate_fold)(params, rounds, X, y, *splits[fold]) for params, fold in tasks)
+        for (params, fold), result in zip(tasks, results):
+            store.add({'key': trial_key(params, rounds, fold, folds, data_version),
+                       'params': params, 'rounds': rounds, 'fold': fold, **result})
+
+        scored = []
+        for params in configs:
+            fold_results = [store.get(trial_key(params, rounds, fold, folds, data_version)) for fold in range(folds)]
+            scored.append({
+                'params': params,
+                'rounds': rounds,
+                'r2': float(np.mean([r['r2'] for r in fold_results])),
+                'rmse': float(np.mean([r['rmse'] for r in fold_results])),
+                'best_iteration': int(np.mean([r['best_iteration'] for r in fold_results])),
+            })
+        scored.sort(key=lambda s: s['r2'], reverse=True)
+        summary.append(scored)
+        configs = [s['params'] for s in scored[:max(1, math.ceil(len(configs) / eta))]]
+    return summary[-1][0], summary
+
+
+def train_final(params, n_estimators, scaler, X_train, y_train, X_test, y_test, output_dir='artifacts'):
+    '''
+    Fit the chosen config on the whole training split and save model and scaler the way the app loads them
+    '''
+    model = XGBRegressor(n_estimators=n_estimators, **params)
+    model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+    metrics = {
+        'r2': float(r2_score(y_test, predictions)),
+        'rmse': float(np.sqrt(mean_squared_error(y_test, predictions))),
+        'mae': float(mean_absolute_error(y_test, predictions)),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    artifacts.save_artifact(model, os.path.join(output_dir, 'xgb_model.pkl'))
+    artifacts.save_artifact(scaler, os.path.join(output_dir, 'scaler.pkl'))
+    return model, metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune and train the XGBoost house price model')
+    parser.add_argument('--data', default=artifacts.PROCESSED_DATA_PATH)
+    parser.add_argument('--trials', default=TRIALS_PATH, help='JSON lines file of completed evaluations')
+    parser.add_argument('--output-dir', default='artifacts', help='where xgb_model.pkl and scaler.pkl are written')
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=-1, help='parallel fold evaluations (-1 uses every core)')
+    args = parser.parse_args(argv)
+
+    scaler, X_train, X_test, y_train, y_test = load_training_data(args.data)
+    start = time.perf_counter()
+    best, _ = successive_halving(X_train, y_train, TrialStore(args.trials), max_rounds=args.max_rounds,
+                                 folds=args.folds, n_jobs=args.n_jobs)
+    print(f"Best parameters: {best['params']} with {best['best_iteration'] + 1} rounds "
+          f"(CV R2 {best['r2']:.4f}, search took {time.perf_counter() - start:.1f}s)")
+
+    _, metrics = train_final(best['params'], best['best_iteration'] + 1, scaler, X_train, y_train, X_test, y_test, args.output_dir)
+    print(f"Test R2 {metrics['r2']:.4f}, RMSE {metrics['rmse']:.0f}, MAE {metrics['mae']:.0f}. "
+          f"Model and scaler saved to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()